@@ -0,0 +1,267 @@
+#!/usr/bin/env python3.9
+
+import argparse
+import json
+import os
+import pathlib
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+
+repo_dir = f"{pathlib.Path(os.path.abspath(__file__)).parent.parent}"
+
+
+def ParseArgs() -> Any:
+    argparser = argparse.ArgumentParser(
+        prog="benchmark",
+        description="time command-zoo.py and command groups on synthetic configs",
+        add_help=True,
+        epilog="",
+    )
+    argparser.add_argument(
+        "--groups",
+        type=int,
+        default=20,
+        required=False,
+        help="number of command groups",
+    )
+    argparser.add_argument(
+        "--commands",
+        type=int,
+        default=50,
+        required=False,
+        help="number of commands per group",
+    )
+    argparser.add_argument(
+        "--args",
+        type=int,
+        default=20,
+        required=False,
+        help="number of arguments per command",
+    )
+    argparser.add_argument(
+        "-n",
+        "--repeat",
+        type=int,
+        default=10,
+        required=False,
+        help="number of runs per phase",
+    )
+    argparser.add_argument(
+        "-p",
+        "--phase",
+        type=str,
+        action="append",
+        required=False,
+        help="only run this phase (repeatable)",
+    )
+    argparser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        required=False,
+        help="write the json report to this file instead of stdout",
+    )
+    argparser.add_argument(
+        "--keep",
+        action="store_true",
+        required=False,
+        help="keep the temporary work directory",
+    )
+    return argparser.parse_args()
+
+
+def SynthesizeCommandList(num_groups: int, num_commands: int, num_args: int) -> Any:
+    # Same shape as samples/cmdz.json, scaled up. command_0 has no line of
+    # its own, so an unknown argument of it is answered with suggestions.
+    json_load_list = []
+    for i in range(num_groups):
+        commands = []
+        for j in range(num_commands):
+            commands.append(
+                {
+                    "cmd": f"command_{j}",
+                    "desc": f"command_{j} of group_{i}",
+                    "line": f"true group_{i} command_{j}" if j else "",
+                    "args": [
+                        {
+                            "arg": f"argument_{j}_{k}",
+                            "desc": f"argument_{k} of command_{j}",
+                            "line": f"true https://example.com/{i}/{j}/{k}",
+                        }
+                        for k in range(num_args)
+                    ],
+                }
+            )
+        json_load_list.append(
+            {
+                "group": f"group_{i}",
+                "description": f"synthetic group {i}",
+                "commands": commands,
+            }
+        )
+    return json_load_list
+
+
+def PrepareWorkDir(work_dir: str, json_load_list: Any) -> None:
+    shutil.copy(f"{repo_dir}/command-zoo.py", work_dir)
+    shutil.copytree(
+        f"{repo_dir}/src",
+        f"{work_dir}/src",
+        ignore=shutil.ignore_patterns("__pycache__"),
+    )
+    with open(f"{work_dir}/commands.json", mode="wt", encoding="utf-8") as file:
+        json.dump(json_load_list, file, ensure_ascii=False, indent=2)
+
+
+def RunOnce(cmd: Any, cwd: str) -> Any:
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    max_rss_kb = rusage.ru_maxrss
+    if sys.platform == "darwin":
+        max_rss_kb //= 1024
+    return elapsed_ms, max_rss_kb, proc.returncode
+
+
+def Percentile(values: Any, percent: float) -> float:
+    values = sorted(values)
+    index = (len(values) - 1) * percent / 100
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+def Summarize(elapsed: Any, max_rss: Any, returncodes: Any) -> Any:
+    return {
+        "runs": len(elapsed),
+        "median_ms": statistics.median(elapsed),
+        "p90_ms": Percentile(elapsed, 90),
+        "p99_ms": Percentile(elapsed, 99),
+        "min_ms": min(elapsed),
+        "max_ms": max(elapsed),
+        "peak_rss_kb": max(max_rss),
+        "returncodes": sorted(set(returncodes)),
+    }
+
+
+def ResetUserDir(work_dir: str) -> None:
+    shutil.rmtree(f"{work_dir}/user", ignore_errors=True)
+
+
+def AddStaleGroup(work_dir: str) -> None:
+    user_dir = f"{work_dir}/user"
+    if not os.path.lexists(f"{user_dir}/stale_group"):
+        os.symlink(f"{work_dir}/src/commands_client.py", f"{user_dir}/stale_group")
+    shutil.copy(f"{user_dir}/json/group_0.json", f"{user_dir}/json/stale_group.json")
+    shutil.copy(f"{user_dir}/zsh_func/_group_0", f"{user_dir}/zsh_func/_stale_group")
+
+
+def GetPhases(work_dir: str) -> Any:
+    python = sys.executable
+    zoo = [python, f"{work_dir}/command-zoo.py"]
+    group = [python, f"{work_dir}/user/group_0"]
+    load = [
+        python,
+        "-c",
+        "import importlib.util, sys;"
+        f"spec = importlib.util.spec_from_file_location('zoo', {work_dir + '/command-zoo.py'!r});"
+        "zoo = importlib.util.module_from_spec(spec); spec.loader.exec_module(zoo);"
+        f"zoo.LoadConfigItems({work_dir + '/commands.json'!r})",
+    ]
+    # name: (command, setup before each run, text its output must contain)
+    return {
+        "load": (load, None, None),
+        "generate": (zoo + ["--force"], ResetUserDir, None),
+        "generate_noop": (zoo, None, None),
+        "check": (zoo + ["-c"], None, None),
+        "remove": (zoo + ["-r"], AddStaleGroup, None),
+        "show_commands": (zoo + ["-s"], None, None),
+        "dispatch": (group + ["command_1", "argument_1_1"], None, None),
+        "help": (group + ["help"], None, None),
+        "help_command": (group + ["help", "command_1"], None, None),
+        "suggest": (group + ["command_x"], None, "most similar commands"),
+        "suggest_argument": (
+            group + ["command_0", "argument_0_x"],
+            None,
+            "most similar arguments",
+        ),
+        "show": (group + ["command_1", "argument_1_1", "--show"], None, None),
+    }
+
+
+def CheckOutput(cmd: Any, cwd: str, expected: str) -> None:
+    # A phase that silently runs something else measures the wrong path.
+    proc = subprocess.run(
+        cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    if expected not in proc.stdout:
+        error_message = f"[ERROR] \033[31m{' '.join(cmd[1:])}\033[0m did not print "
+        error_message += f"'{expected}':\n{proc.stdout}"
+        sys.exit(error_message)
+
+
+def main() -> int:
+    args = ParseArgs()
+    work_dir = tempfile.mkdtemp(prefix="command-zoo-bench-")
+    json_load_list = SynthesizeCommandList(args.groups, args.commands, args.args)
+    PrepareWorkDir(work_dir, json_load_list)
+
+    # Generate once so the alias phases have something to run.
+    RunOnce([sys.executable, f"{work_dir}/command-zoo.py"], work_dir)
+
+    report = {
+        "config": {
+            "groups": args.groups,
+            "commands": args.commands,
+            "args": args.args,
+            "repeat": args.repeat,
+        },
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "phases": {},
+    }
+    for name, (cmd, setup, expected) in GetPhases(work_dir).items():
+        if args.phase and name not in args.phase:
+            continue
+        if expected is not None:
+            CheckOutput(cmd, work_dir, expected)
+        elapsed, max_rss, returncodes = [], [], []
+        for _ in range(args.repeat):
+            if setup is not None:
+                setup(work_dir)
+            elapsed_ms, max_rss_kb, returncode = RunOnce(cmd, work_dir)
+            elapsed.append(elapsed_ms)
+            max_rss.append(max_rss_kb)
+            returncodes.append(returncode)
+        report["phases"][name] = Summarize(elapsed, max_rss, returncodes)
+        print(
+            f"[INFO] {name:16} median {report['phases'][name]['median_ms']:9.2f} ms",
+            file=sys.stderr,
+        )
+
+    if args.keep:
+        print(f"[INFO] Work directory: \033[34m{work_dir}\033[0m", file=sys.stderr)
+    else:
+        shutil.rmtree(work_dir)
+
+    report_str = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, mode="wt", encoding="utf-8") as file:
+            file.write(report_str + "\n")
+    else:
+        print(report_str)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3.9
+
+import argparse
+import gc
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from typing import Any
+
+# Reports the size of a large group's json, its dispatch cache and the setting
+# loaded from it, what the generator keeps while checking the config, and the
+# peak RSS of a dispatch that loads the whole group.
+
+src_dir = f"{pathlib.Path(os.path.abspath(__file__)).parent.parent}/src"
+sys.path.insert(0, src_dir)
+import commands as group_commands
+import config
+
+# Lines of inventory-generated groups: one long shared prefix per command and
+# a short host specific tail, descriptions drawn from a few values.
+LINE_PREFIXES = [
+    "ssh -o StrictHostKeyChecking=no -o ConnectTimeout=5 -J bastion.{env}.example.com",
+    "kubectl --context {env}-cluster --namespace inventory exec -it deploy/agent --",
+]
+DESCRIPTIONS = ["web host", "db host", "cache host", "batch host", "edge host"]
+ENVS = ["prod", "stage", "dev", "qa"]
+
+# The peak RSS of a forked process starts at its parent's, so a small
+# wrapper runs the command group and reports the peak of that child.
+MAXRSS_SCRIPT = """
+import resource, subprocess, sys
+subprocess.run(sys.argv[1:], stdout=subprocess.DEVNULL)
+print(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+"""
+
+
+def ParseArgs() -> Any:
+    argparser = argparse.ArgumentParser(
+        prog="memory_model",
+        description="measure memory of a large command group in src/commands.py",
+        add_help=True,
+        epilog="",
+    )
+    argparser.add_argument(
+        "--args",
+        type=int,
+        default=50000,
+        required=False,
+        help="number of arguments in the synthetic group",
+    )
+    argparser.add_argument(
+        "--commands",
+        type=int,
+        default=8,
+        required=False,
+        help="number of commands the arguments are spread over",
+    )
+    return argparser.parse_args()
+
+
+def CreateLargeGroup(user_dir: str, group: str, num_args: int, num_cmds: int) -> str:
+    commands = []
+    for i in range(num_cmds):
+        env = ENVS[i % len(ENVS)]
+        prefix = LINE_PREFIXES[i % len(LINE_PREFIXES)].format(env=env)
+        commands.append(
+            {
+                "cmd": f"{env}_{i}",
+                "desc": f"hosts of {env}",
+                "args": [
+                    {
+                        "arg": f"host-{j:06d}",
+                        "desc": DESCRIPTIONS[j % len(DESCRIPTIONS)],
+                        "line": f"{prefix} admin@host-{j:06d}.{env}.example.com",
+                    }
+                    for j in range(i, num_args, num_cmds)
+                ],
+            }
+        )
+    json_load = {"group": group, "description": "large sample", "commands": commands}
+    os.makedirs(f"{user_dir}/json")
+    user_json_file = f"{user_dir}/json/{group}.json"
+    with open(user_json_file, mode="wt", encoding="utf-8") as file:
+        json.dump(json_load, file, ensure_ascii=False, indent=2)
+    group_commands.DumpCommandCache(json_load, user_json_file)
+    os.symlink(f"{src_dir}/commands.py", f"{user_dir}/{group}")
+    return user_json_file
+
+
+def MeasureRetainedBytes(func: Any, *args: Any) -> Any:
+    # (retained, peak) bytes allocated by func while its result is alive.
+    gc.collect()
+    tracemalloc.start()
+    result = func(*args)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained, peak
+
+
+def MeasureMaxRssKiB(cmd: Any) -> int:
+    proc = subprocess.run(
+        [sys.executable, "-c", MAXRSS_SCRIPT, sys.executable] + cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    return int(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    args = ParseArgs()
+    with tempfile.TemporaryDirectory() as user_dir:
+        user_json_file = CreateLargeGroup(user_dir, "large", args.args, args.commands)
+        cache_file = group_commands.GetCommandCachePath(user_json_file)
+        results = {
+            "json_bytes": os.path.getsize(user_json_file),
+            "cache_bytes": os.path.getsize(cache_file),
+        }
+        # Heap only: the argument tables stay in the mapped cache, whose
+        # touched pages show up in the maxrss numbers below.
+        results["runtime_setting_bytes"] = MeasureRetainedBytes(
+            group_commands.LoadCommandSetting, user_json_file
+        )[0]
+        results["generator_load_bytes"], results["generator_peak_bytes"] = (
+            MeasureRetainedBytes(config.LoadConfigFile, user_json_file, True)
+        )
+        results["unknown_arg_maxrss_kib"] = MeasureMaxRssKiB(
+            [f"{user_dir}/large", "prod_0", "no-such-host", "-s"]
+        )
+        results["dispatch_maxrss_kib"] = MeasureMaxRssKiB(
+            [f"{user_dir}/large", "prod_0", "host-000000", "-s"]
+        )
+    for name, value in results.items():
+        print(f"{name:24}: {value:12,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
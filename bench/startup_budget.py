@@ -0,0 +1,151 @@
+#!/usr/bin/env python3.9
+
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+
+src_dir = f"{pathlib.Path(os.path.abspath(__file__)).parent.parent}/src"
+sys.path.insert(0, src_dir)
+import commands as group_commands
+
+# Modules that a plain `group command arg -s` dispatch must not import, with
+# or without a running commands_server.py.
+LAZY_MODULES = ["argparse", "clipboard", "difflib", "json", "re", "socket"]
+LAZY_MODULES += ["subprocess"]
+
+
+def ParseArgs() -> Any:
+    argparser = argparse.ArgumentParser(
+        prog="startup_budget",
+        description="check cold-start cost of alias dispatch in src/commands.py",
+        add_help=True,
+        epilog="",
+    )
+    argparser.add_argument(
+        "--budget_ms",
+        type=float,
+        default=20.0,
+        required=False,
+        help="allowed dispatch time over bare interpreter startup",
+    )
+    argparser.add_argument(
+        "-n",
+        "--repeat",
+        type=int,
+        default=20,
+        required=False,
+        help="number of runs to take the median of",
+    )
+    return argparser.parse_args()
+
+
+def CreateSampleGroup(user_dir: str, group: str) -> None:
+    json_load = {
+        "group": group,
+        "description": "startup budget sample",
+        "commands": [
+            {
+                "cmd": f"command_{i}",
+                "desc": f"command_{i} desc.",
+                "line": f"echo command_{i}",
+                "args": [
+                    {"arg": f"arg_{j}", "desc": f"arg_{j} desc.", "line": f"echo {j}"}
+                    for j in range(10)
+                ],
+            }
+            for i in range(100)
+        ],
+    }
+    os.makedirs(f"{user_dir}/json")
+    user_json_file = f"{user_dir}/json/{group}.json"
+    with open(user_json_file, mode="wt", encoding="utf-8") as file:
+        json.dump(json_load, file, ensure_ascii=False, indent=2)
+    group_commands.DumpCommandCache(json_load, user_json_file)
+    os.symlink(f"{src_dir}/commands_client.py", f"{user_dir}/{group}")
+
+
+def MeasureMedianMs(cmd: Any, repeat: int) -> float:
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True)
+        elapsed.append((time.perf_counter() - start) * 1000)
+    return statistics.median(elapsed)
+
+
+def FindLazyImports(cmd: Any) -> Any:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime"] + cmd[1:],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    imported = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        imported.add(line.rsplit("|", 1)[-1].strip())
+    return [module for module in LAZY_MODULES if module in imported]
+
+
+def StartServer(user_dir: str) -> Any:
+    # The sample has no alias index, so every dispatch asks the server.
+    server = subprocess.Popen(
+        [sys.executable, f"{src_dir}/commands_server.py", "-u", user_dir],
+        stdout=subprocess.DEVNULL,
+    )
+    socket_path = f"{user_dir}/.commands.sock"
+    deadline = time.monotonic() + 10.0
+    while not os.path.exists(socket_path):
+        if server.poll() is not None or time.monotonic() > deadline:
+            server.kill()
+            sys.exit("[ERROR] \033[31mcommands_server.py did not start.\033[0m")
+        time.sleep(0.05)
+    return server
+
+
+def main() -> int:
+    args = ParseArgs()
+    results = {}
+    with tempfile.TemporaryDirectory() as user_dir:
+        CreateSampleGroup(user_dir, "budget")
+        cmd = [sys.executable, f"{user_dir}/budget", "command_50", "arg_5", "-s"]
+
+        baseline_ms = MeasureMedianMs([sys.executable, "-c", "pass"], args.repeat)
+        results["alias dispatch"] = FindLazyImports(cmd), MeasureMedianMs(
+            cmd, args.repeat
+        )
+        server = StartServer(user_dir)
+        try:
+            results["server dispatch"] = FindLazyImports(cmd), MeasureMedianMs(
+                cmd, args.repeat
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"interpreter startup : {baseline_ms:8.2f} ms")
+    is_ok = True
+    for name, (lazy_imports, dispatch_ms) in results.items():
+        overhead_ms = dispatch_ms - baseline_ms
+        print(f"{name:20}: {dispatch_ms:8.2f} ms")
+        print(f"{'  overhead':20}: {overhead_ms:8.2f} ms (budget {args.budget_ms} ms)")
+        if lazy_imports:
+            print(f"[ERROR] \033[31mEagerly imported\033[0m: {' '.join(lazy_imports)}")
+            is_ok = False
+        if overhead_ms > args.budget_ms:
+            print(f"[ERROR] \033[31mOver the startup budget.\033[0m")
+            is_ok = False
+    return 0 if is_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
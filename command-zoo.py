@@ -1,18 +1,50 @@
 #!/usr/bin/env python3.9
 
 import argparse
+import contextlib
+import fnmatch
+import functools
+import glob
+import hashlib
+import io
 import json
+import marshal
+import multiprocessing
 import os
 import pathlib
 import shutil
 import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from enum import Enum, auto
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from pathlib import Path
 from subprocess import PIPE
 from typing import Any
 
+sys.path.insert(0, f"{pathlib.Path(os.path.abspath(__file__)).parent}/src")
+import alias_index
+import commands as group_commands
+import complete
+import config
+import stats
+import suggest
+import tables
+import timing
+import watch
+
+VERSION = "0.0"
+MANIFEST_NAME = ".manifest.json"
+JINJA_CACHE_NAME = ".jinja_cache"
+FPATH_CACHE_NAME = ".fpath_cache.json"
+ZSH_RC_FILES = ["~/.zshrc", "~/.zshenv"]
+ZSH_TEMPLATES = {"static": "zsh_func.tpl", "dynamic": "zsh_func_dynamic.tpl"}
+DYNAMIC_COMPLETION_THRESHOLD = 500
+SHARD_CACHE_NAME = ".shard_cache"
+SHARD_CACHE_VERSION = 3
+WATCH_DEBOUNCE = 0.3
+WATCH_POLL_INTERVAL = 1.0
+
 
 def ParseArgs() -> Any:
     argparser = argparse.ArgumentParser(
@@ -33,7 +65,7 @@ def ParseArgs() -> Any:
         "--json",
         type=str,
         required=False,
-        help="specify input json file",
+        help="specify input json file, a directory of json files or a quoted glob",
     )
     argparser.add_argument(
         "-c",
@@ -69,6 +101,87 @@ def ParseArgs() -> Any:
         required=False,
         help="show command usages.",
     )
+    argparser.add_argument(
+        "--stats",
+        action="store_true",
+        required=False,
+        help="show call counts, latency, mistypes and unused entries from the "
+        "call log (COMMAND_ZOO_STATS=1)",
+    )
+    argparser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        required=False,
+        help="number of entries listed per table (with --stats)",
+    )
+    argparser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        required=False,
+        help="regenerate all commands even if the manifest says unchanged",
+    )
+    argparser.add_argument(
+        "--watch",
+        action="store_true",
+        required=False,
+        help="stay running and regenerate the command groups changed by each save "
+        "of the input json",
+    )
+    argparser.add_argument(
+        "--stream",
+        action="store_true",
+        required=False,
+        help="read input json one command group at a time",
+    )
+    argparser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        required=False,
+        help="number of command groups to generate (and config files to load) in "
+        "parallel",
+    )
+    argparser.add_argument(
+        "--completion",
+        type=str,
+        choices=["auto", "static", "dynamic"],
+        default="auto",
+        required=False,
+        help="zsh completion: word lists in the function (static), asked from the "
+        f"command (dynamic), or dynamic above {DYNAMIC_COMPLETION_THRESHOLD} "
+        "commands and arguments (auto)",
+    )
+    argparser.add_argument(
+        "--no_alias_index",
+        action="store_true",
+        required=False,
+        help="do not write the binary alias index (and remove an existing one)",
+    )
+    argparser.add_argument(
+        "--json_summary",
+        action="store_true",
+        required=False,
+        help="print the status summary as json (use with -c)",
+    )
+    argparser.add_argument(
+        "-g",
+        "--group",
+        type=str,
+        action="append",
+        required=False,
+        help="only show command groups matching this pattern (with -s or --stats)",
+    )
+    argparser.add_argument(
+        "--profile",
+        type=str,
+        nargs="?",
+        const="1",
+        metavar="SPEC",
+        required=False,
+        help="print phase timings; SPEC may add chrome=FILE,cprofile=FILE",
+    )
     argparser.add_argument(
         "--verbose",
         action="store_true",
@@ -92,36 +205,293 @@ class CommandUpdateState(Enum):
 
 
 class CommandFileStatus:
-    availability = CommandAvailability.Empty
-    update_state = CommandUpdateState.NoChange
-    has_config = False
-
-
-def IsJson(json_str: str) -> bool:
-    file_open = open(json_str, "r")
-    try:
-        json_obj = json.loads(file_open.read())
-    except ValueError as e:
-        return False
-    return True
+    # One per group in the status map, so no per-instance __dict__.
+    __slots__ = ("availability", "update_state", "has_config")
+
+    def __init__(self) -> None:
+        self.availability = CommandAvailability.Empty
+        self.update_state = CommandUpdateState.NoChange
+        self.has_config = False
+
+
+def IsGlobPattern(path: str) -> bool:
+    return any(char in path for char in "*?[")
+
+
+def ExpandConfigPaths(pattern: str, base_dir: str = "") -> Any:
+    # Absolute paths of a config file, the *.json of a directory, or the
+    # files matching a glob; relative ones are taken from base_dir.
+    pattern = os.path.join(base_dir, pattern)
+    if IsGlobPattern(pattern):
+        paths = [
+            path
+            for path in sorted(glob.glob(pattern, recursive=True))
+            if os.path.isfile(path)
+        ]
+    elif os.path.isdir(pattern):
+        paths = sorted(glob.glob(f"{glob.escape(pattern)}/*.json"))
+    else:
+        paths = [pattern]
+    return [os.path.abspath(path) for path in paths]
 
 
-def LoadJsonFile(command_list_json: Any) -> Any:
-    if not IsJson(command_list_json):
-        error_message = f"\033[31m{command_list_json} is not json format.\033[0m \n"
-        error_message += f"Please fix \033[34m{command_list_json}\033[0m.\n"
-        proc = subprocess.run(
-            [f"jq . {command_list_json}"],
-            shell=True,
-            stdout=PIPE,
-            stderr=PIPE,
-            text=True,
-        )
-        error_message += proc.stderr
+def GetInputPaths(json_file_path: str) -> Any:
+    # An input directory or glob without any file would read as a config
+    # from which every group was removed.
+    paths = ExpandConfigPaths(json_file_path)
+    if not paths:
+        if os.path.isdir(json_file_path):
+            error_message = f"No input json in {json_file_path}."
+        else:
+            error_message = f"No input json matches {json_file_path}."
+        sys.exit(f"[ERROR] \033[31m{error_message}\033[0m")
+    return paths
+
+
+def GetShardCachePath(cache_dir: str, shard_path: str) -> str:
+    return f"{cache_dir}/{hashlib.sha256(shard_path.encode()).hexdigest()}"
+
+
+def GetShardItemsState(items: Any) -> Any:
+    # The argument tables of the settings are written as their buffers.
+    return [
+        (json_path, (tables.GetCommandsState(setting[0]),) + setting[1:])
+        for json_path, setting in items
+    ]
+
+
+def RestoreShardItems(items: Any) -> Any:
+    return [
+        (json_path, (tables.RestoreCommands(setting[0]),) + setting[1:])
+        for json_path, setting in items
+    ]
+
+
+def LoadShard(shard_path: str, cache_dir: Any) -> Any:
+    # (items, includes, error message) of one config file. A shard without
+    # errors is cached by mtime and size, so an unchanged one is read back
+    # with marshal instead of being parsed and checked again.
+    cache_path = None
+    if cache_dir is not None:
+        try:
+            stat = os.stat(shard_path)
+            cache_key = SHARD_CACHE_VERSION, shard_path, stat.st_mtime_ns, stat.st_size
+            cache_path = GetShardCachePath(cache_dir, shard_path)
+            with open(cache_path, "rb") as file:
+                key, items, includes = marshal.loads(file.read())
+            if key == cache_key:
+                return RestoreShardItems(items), includes, None
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+    items, includes, errors = config.LoadConfigFile(shard_path)
+    if errors:
+        return [], [], config.FormatConfigErrors(errors, shard_path)
+    if cache_path is not None:
+        try:
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            cache_tmp = f"{cache_path}.{os.getpid()}.tmp"
+            with open(cache_tmp, mode="wb") as file:
+                marshal.dump((cache_key, GetShardItemsState(items), includes), file)
+            os.replace(cache_tmp, cache_path)
+        except (OSError, ValueError):
+            pass
+    return items, includes, None
+
+
+def CreateProcessPool(jobs: int) -> Any:
+    # Workers start from a fork server instead of forking this process while
+    # the env check threads are running.
+    context = multiprocessing.get_context("forkserver")
+    return ProcessPoolExecutor(max_workers=jobs, mp_context=context)
+
+
+def GetDuplicateGroupError(group: str, places: Any) -> str:
+    lines = [f"[ERROR] \033[31mCommand group {group} is defined more than once.\033[0m"]
+    for shard_path, json_path in places:
+        error = config.ConfigError(json_path, f"defines {group}.")
+        config.LocateFileErrors([error], shard_path)
+        lines.append(error.Format(shard_path))
+    return "\n".join(lines)
+
+
+def LoadConfigShards(json_file_path: str, cache_dir: Any, jobs: int) -> Any:
+    # Returns ([setting], shard paths) of a config file,
+    # directory or glob and everything it includes. Each round of newly
+    # included shards is loaded in parallel when jobs > 1.
+    pending = list(dict.fromkeys(GetInputPaths(json_file_path)))
+    queued = set(pending)
+    shards = {}
+    executor = None
+    while pending:
+        if jobs > 1 and len(pending) > 1:
+            if executor is None:
+                executor = CreateProcessPool(jobs)
+            results = executor.map(
+                LoadShard, pending, [cache_dir] * len(pending), chunksize=8
+            )
+        else:
+            results = (LoadShard(shard_path, cache_dir) for shard_path in pending)
+        included = []
+        for shard_path, result in zip(pending, results):
+            shards[shard_path] = result
+            for pattern in result[1]:
+                for path in ExpandConfigPaths(pattern, os.path.dirname(shard_path)):
+                    if path not in queued:
+                        queued.add(path)
+                        included.append(path)
+        pending = included
+    if executor is not None:
+        executor.shutdown()
+
+    error_messages = [result[2] for result in shards.values() if result[2]]
+    group_places = {}
+    config_items = []
+    for shard_path, (items, _, _) in shards.items():
+        for json_path, setting in items:
+            group_places.setdefault(setting[1], []).append((shard_path, json_path))
+            if len(group_places[setting[1]]) == 1:
+                config_items.append(setting)
+    for group, places in group_places.items():
+        if len(places) > 1:
+            error_messages.append(GetDuplicateGroupError(group, places))
+    if error_messages:
+        sys.exit("\n".join(error_messages))
+    return config_items, list(shards)
+
+
+def LoadConfigItems(
+    json_file_path: str, cache_dir: Any = None, jobs: int = 1
+) -> Any:
+    # [(commands, group, discription)] of every group, after reporting all
+    # problems of all shards at once. Only the normalized settings are kept;
+    # the json written for a group is rebuilt from its setting.
+    return LoadConfigShards(json_file_path, cache_dir, jobs)[0]
+
+
+def GetShardCacheDir(user_dir: str) -> Any:
+    # Only kept once the user directory exists, so -c writes nothing new.
+    return f"{user_dir}/{SHARD_CACHE_NAME}" if os.path.isdir(user_dir) else None
+
+
+class JsonStreamReader:
+    # Walks a top-level json array one item at a time, keeping only the
+    # unparsed text of the current item in memory.
+    def __init__(self, file: Any, command_list_json: str, chunk_size: int) -> None:
+        self.file = file
+        self.command_list_json = command_list_json
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.is_eof = False
+        self.line = 1
+        self.column = 1
+
+    def Read(self, size: int) -> bool:
+        if self.is_eof:
+            return False
+        chunk = self.file.read(size)
+        self.is_eof = not chunk
+        self.buffer += chunk
+        return not self.is_eof
+
+    def Consume(self, end: int) -> None:
+        consumed = self.buffer[:end]
+        newlines = consumed.count("\n")
+        if newlines:
+            self.line += newlines
+            self.column = len(consumed) - consumed.rfind("\n")
+        else:
+            self.column += len(consumed)
+        self.buffer = self.buffer[end:]
+
+    def PeekToken(self) -> str:
+        while True:
+            stripped = self.buffer.lstrip(" \t\n\r")
+            self.Consume(len(self.buffer) - len(stripped))
+            if self.buffer or not self.Read(self.chunk_size):
+                return self.buffer[:1]
+
+    def DecodeValue(self) -> Any:
+        self.PeekToken()
+        while True:
+            try:
+                json_load, end = self.decoder.raw_decode(self.buffer)
+            except json.JSONDecodeError as e:
+                if self.Read(max(self.chunk_size, len(self.buffer))):
+                    continue
+                self.Fail(e.msg, e.lineno, e.colno)
+            if end == len(self.buffer) and self.Read(self.chunk_size):
+                continue
+            self.Consume(end)
+            return json_load
+
+    def Fail(self, msg: str, lineno: int = 1, colno: int = 1) -> None:
+        line = self.line + lineno - 1
+        column = colno + self.column - 1 if lineno == 1 else colno
+        error_message = f"\033[31m{self.command_list_json} is not json format.\033[0m \n"
+        error_message += f"Please fix \033[34m{self.command_list_json}\033[0m.\n"
+        error_message += f"{msg}: line {line} column {column}\n"
         sys.exit(error_message)
-    json_open = open(command_list_json, "r")
-    json_load_list = json.load(json_open)
-    return json_load_list
+
+    def Items(self) -> Any:
+        if self.PeekToken() != "[":
+            self.Fail("Expecting '['")
+        self.Consume(1)
+        if self.PeekToken() == "]":
+            self.Consume(1)
+        else:
+            while True:
+                yield self.DecodeValue()
+                token = self.PeekToken()
+                if token not in ("]", ","):
+                    self.Fail("Expecting ',' delimiter")
+                self.Consume(1)
+                if token == "]":
+                    break
+        if self.PeekToken():
+            self.Fail("Extra data")
+
+
+def IterJsonFile(command_list_json: Any, chunk_size: int = 1 << 16) -> Any:
+    with open(command_list_json, "r", encoding="utf-8") as file:
+        yield from JsonStreamReader(file, command_list_json, chunk_size).Items()
+
+
+def IterConfigItems(json_file_path: str) -> Any:
+    # LoadConfigItems for --stream: one group at a time, in the same order,
+    # without the shard cache.
+    pending = list(dict.fromkeys(GetInputPaths(json_file_path)))
+    queued = set(pending)
+    group_places = {}
+    while pending:
+        shard_path = pending.pop(0)
+        for i, json_load in enumerate(IterJsonFile(shard_path)):
+            errors = []
+            patterns = config.GetIncludePatterns(json_load, (i,), errors)
+            if patterns is None:
+                setting = config.NormalizeGroupItem(json_load, (i,), errors)
+            if errors:
+                sys.exit(config.FormatConfigErrors(errors, shard_path))
+            if patterns is not None:
+                for pattern in patterns:
+                    for path in ExpandConfigPaths(pattern, os.path.dirname(shard_path)):
+                        if path not in queued:
+                            queued.add(path)
+                            pending.append(path)
+                continue
+            group = setting[1]
+            if group in group_places:
+                places = [group_places[group], (shard_path, (i,))]
+                sys.exit(GetDuplicateGroupError(group, places))
+            group_places[group] = shard_path, (i,)
+            yield setting
+
+
+def LoadCommandGroups(json_file_path: str, cache_dir: Any, jobs: int) -> Any:
+    # ({group: setting}, shard paths)
+    config_items, shard_paths = LoadConfigShards(json_file_path, cache_dir, jobs)
+    return {setting[1]: setting for setting in config_items}, shard_paths
 
 
 def yes_or_no(ask_str: str) -> bool:
@@ -135,6 +505,50 @@ def yes_or_no(ask_str: str) -> bool:
             return False
 
 
+def LoadManifest(user_dir: str) -> Any:
+    try:
+        with open(f"{user_dir}/{MANIFEST_NAME}", "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get("version") != VERSION:
+        return {}
+    return manifest.get("groups", {})
+
+
+def DumpManifest(user_dir: str, group_digests: Any) -> None:
+    manifest_file = f"{user_dir}/{MANIFEST_NAME}"
+    with open(f"{manifest_file}.tmp", mode="wt", encoding="utf-8") as file:
+        json.dump({"version": VERSION, "groups": group_digests}, file, indent=2)
+    os.replace(f"{manifest_file}.tmp", manifest_file)
+
+
+def GetGenerationDigest(src_dir: str, completion: str) -> str:
+    # Everything besides the group's own json that shapes its artifacts.
+    digest = hashlib.sha256()
+    digest.update(f"{VERSION}\0{src_dir}\0{completion}\0".encode())
+    digest.update(f"{group_commands.COMMAND_CACHE_VERSION}\0".encode())
+    digest.update(f"{group_commands.HELP_CACHE_VERSION}\0".encode())
+    digest.update(f"{suggest.SUGGEST_INDEX_VERSION}\0".encode())
+    digest.update(f"{complete.COMPLETE_INDEX_VERSION}\0".encode())
+    for zsh_template in ZSH_TEMPLATES.values():
+        with open(f"{src_dir}/{zsh_template}", "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def GetGroupDigest(setting: Any, generation_digest: str) -> str:
+    canonical = json.dumps(
+        config.GetGroupJson(setting),
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    digest = hashlib.sha256(generation_digest.encode())
+    digest.update(canonical.encode())
+    return digest.hexdigest()
+
+
 def CheckUserDirectory(user_dir: str, verbose: bool) -> None:
     if not os.path.isdir(user_dir):
         print(f"[INFO] mkdir \033[34m{os.path.abspath(user_dir)}\033[0m")
@@ -160,52 +574,148 @@ def CheckUserDirectory(user_dir: str, verbose: bool) -> None:
     return
 
 
-def CheckAvailability(user_dir: str, group: str) -> bool:
-    if os.path.exists(f"{user_dir}/{group}"):
-        if os.path.exists(f"{user_dir}/json/{group}.json"):
-            if os.path.exists(f"{user_dir}/zsh_func/_{group}"):
-                return True
-    return False
+class UserDirIndex:
+    # Names found by one scandir pass over user/, user/json and user/zsh_func,
+    # so status checks are set lookups instead of stat calls per group.
+    def __init__(self, user_dir: str) -> None:
+        self.user_dir = user_dir
+        self.Scan()
+
+    def Scan(self) -> None:
+        self.entries = set()
+        self.exec_files = set()
+        self.json_files = set()
+        self.zsh_func_files = set()
+        for entry in self.ScanDir(self.user_dir):
+            if entry.name.startswith(".") or entry.is_dir():
+                continue
+            self.entries.add(entry.name)
+            if entry.is_file():
+                self.exec_files.add(entry.name)
+        for entry in self.ScanDir(f"{self.user_dir}/json"):
+            if entry.name.endswith(".json") and entry.is_file():
+                self.json_files.add(entry.name[: -len(".json")])
+        for entry in self.ScanDir(f"{self.user_dir}/zsh_func"):
+            if entry.name.startswith("_") and entry.is_file():
+                self.zsh_func_files.add(entry.name[1:])
+
+    def ScanDir(self, dir_path: str) -> Any:
+        try:
+            with os.scandir(dir_path) as it:
+                return list(it)
+        except OSError:
+            return []
+
+    def IsAvailable(self, group: str) -> bool:
+        return (
+            group in self.exec_files
+            and group in self.json_files
+            and group in self.zsh_func_files
+        )
 
+    def AddGroup(self, group: str) -> None:
+        # Files of a group that was just generated, so no rescan is needed.
+        self.entries.add(group)
+        self.exec_files.add(group)
+        self.json_files.add(group)
+        self.zsh_func_files.add(group)
 
-def FetchCommandFileStatusMap(user_dir: str) -> Any:
+    def RemoveGroup(self, group: str) -> None:
+        self.entries.discard(group)
+        self.exec_files.discard(group)
+        self.json_files.discard(group)
+        self.zsh_func_files.discard(group)
+
+
+def FetchCommandFileStatusMap(user_dir_index: UserDirIndex) -> Any:
     cmd_status_list = {}
-    for file_path in list(Path(user_dir).glob("*")):
-        if os.path.isdir(file_path):
-            continue
-        stem = str(Path(file_path).stem).lstrip("_")
+    for file_name in sorted(user_dir_index.entries):
+        stem = os.path.splitext(file_name)[0].lstrip("_")
         if not stem in cmd_status_list.keys():
             cmd_status_list[stem] = CommandFileStatus()
     return cmd_status_list
 
 
 def LinkExecuteFile(src_dir: str, user_exec_link_file: str) -> bool:
+    exec_file = f"{src_dir}/commands_client.py"
     if os.path.exists(user_exec_link_file):
         link_path_old = os.readlink(user_exec_link_file)
-        if link_path_old == f"{src_dir}/commands.py":
+        if link_path_old == exec_file:
             return False
     print(f"[INFO]     ==>  exec link  : \033[34m{user_exec_link_file}\033[0m")
-    subprocess.run([f"ln -snf {src_dir}/commands.py {user_exec_link_file}"], shell=True)
+    user_exec_link_tmp = f"{user_exec_link_file}.tmp"
+    if os.path.lexists(user_exec_link_tmp):
+        os.remove(user_exec_link_tmp)
+    os.symlink(exec_file, user_exec_link_tmp)
+    os.replace(user_exec_link_tmp, user_exec_link_file)
     return True
 
 
-def DumpCommandJson(json_load: Any, user_json_file: str) -> bool:
-    if os.path.exists(user_json_file):
-        json_load_old = LoadJsonFile(user_json_file)
-        if json_load_old == json_load:
-            return False
+def DumpCommandCache(json_load: Any, user_json_file: str, setting: Any) -> bool:
+    if not timing.Call(
+        "dump_cache",
+        group_commands.DumpCommandCache,
+        json_load,
+        user_json_file,
+        setting,
+    ):
+        return False
+    user_cache_file = group_commands.GetCommandCachePath(user_json_file)
+    print(f"[INFO]     ==>  disp. cache: \033[34m{user_cache_file}\033[0m")
+    return True
+
+
+def DumpCommandJson(setting: Any, user_json_file: str) -> bool:
+    json_load = config.GetGroupJson(setting)
+    try:
+        with open(user_json_file, "r", encoding="utf-8") as file:
+            json_load_old = json.load(file)
+    except (OSError, ValueError):
+        json_load_old = None
+    if json_load_old == json_load:
+        return DumpCommandCache(json_load, user_json_file, setting)
     print(f"[INFO]     ==>  conf. json : \033[34m{user_json_file}\033[0m")
     with open(user_json_file, mode="wt", encoding="utf-8") as file:
         json.dump(json_load, file, ensure_ascii=False, indent=2)
+    DumpCommandCache(json_load, user_json_file, setting)
     return True
 
 
+def GetZshTemplateName(setting: Any, completion: str) -> str:
+    if completion == "auto":
+        num_entries = 0
+        for cmd, cmd_v in setting[0].items():
+            if cmd != "help":
+                num_entries += 1 + len(cmd_v[2])
+        if num_entries > DYNAMIC_COMPLETION_THRESHOLD:
+            completion = "dynamic"
+        else:
+            completion = "static"
+    return ZSH_TEMPLATES[completion]
+
+
+@functools.lru_cache(maxsize=None)
+def GetZshFunctionTemplate(src_dir: str, user_dir: str, zsh_template: str) -> Any:
+    # One environment per process; compiled templates are shared across runs
+    # through the bytecode cache, keyed by the template source checksum.
+    jinja_cache_dir = f"{user_dir}/{JINJA_CACHE_NAME}"
+    os.makedirs(jinja_cache_dir, exist_ok=True)
+    env = Environment(
+        loader=FileSystemLoader(str(src_dir)),
+        bytecode_cache=FileSystemBytecodeCache(jinja_cache_dir),
+        auto_reload=False,
+    )
+    return env.get_template(zsh_template)
+
+
 def GenerateZshFunction(
-    src_dir: str, group: str, json_load: Any, user_zsh_func_file: str
+    template: Any, group: str, setting: Any, user_zsh_func_file: str
 ) -> bool:
-    env = Environment(loader=FileSystemLoader(str(src_dir)))
-    template = env.get_template(f"zsh_func.tpl")
-    zsh_func = template.render({"group": group, "commands": json_load["commands"]})
+    # The template lists the group's own commands as (cmd, cmd_v).
+    commands = [(cmd, cmd_v) for cmd, cmd_v in setting[0].items() if cmd != "help"]
+    zsh_func = timing.Call(
+        "render_zsh", template.render, {"group": group, "commands": commands}
+    )
 
     if os.path.exists(user_zsh_func_file):
         f = open(user_zsh_func_file, "r", encoding="UTF-8")
@@ -220,40 +730,153 @@ def GenerateZshFunction(
 
 
 def GenerateTargetCommand(
-    group: str, src_dir: str, user_dir: str, json_load: Any
+    group: str,
+    src_dir: str,
+    user_dir: str,
+    setting: Any,
+    zsh_template: str,
 ) -> bool:
     group_bold = f"\033[1m{group}\033[0m"
     print(f"[INFO] Generate command group: {group_bold}")
     is_generated = False
-    is_generated |= LinkExecuteFile(src_dir, f"{user_dir}/{group}")
-    is_generated |= DumpCommandJson(json_load, f"{user_dir}/json/{group}.json")
-    is_generated |= GenerateZshFunction(
-        src_dir, group, json_load, f"{user_dir}/zsh_func/_{group}"
+    is_generated |= timing.Call(
+        "exec_link", LinkExecuteFile, src_dir, f"{user_dir}/{group}"
+    )
+    is_generated |= timing.Call(
+        "dump_json", DumpCommandJson, setting, f"{user_dir}/json/{group}.json"
+    )
+    template = timing.Call(
+        "load_template", GetZshFunctionTemplate, src_dir, user_dir, zsh_template
+    )
+    is_generated |= timing.Call(
+        "zsh_func",
+        GenerateZshFunction,
+        template,
+        group,
+        setting,
+        f"{user_dir}/zsh_func/_{group}",
     )
 
+    # Each step above leaves its file in place (written or found current), so
+    # the group is available once they return.
     if not is_generated:
-        if CheckAvailability(user_dir, group):
-            print(f"[INFO] \033[33mNo change.\033[0m\n")
-        else:
-            print(
-                f"[WARNING] \033[33mExistent command is invalid\033[0m: {group_bold}.\n"
-            )
+        print(f"[INFO] \033[33mNo change.\033[0m\n")
     else:
-        if CheckAvailability(user_dir, group):
-            print(f"[INFO] \033[36mComplete.\033[0m\n")
-        else:
-            print(
-                f"[WARNING] \033[33mFailed to generate command\033[0m: {group_bold}.\n"
-            )
+        print(f"[INFO] \033[36mComplete.\033[0m\n")
     return is_generated
 
 
+def GenerateTargetCommandCaptured(
+    group: str,
+    src_dir: str,
+    user_dir: str,
+    setting: Any,
+    zsh_template: str,
+) -> Any:
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        is_generated = GenerateTargetCommand(
+            group, src_dir, user_dir, setting, zsh_template
+        )
+    return is_generated, output.getvalue()
+
+
+def GenerateTargetCommandsParallel(
+    generate_targets: Any, src_dir: str, user_dir: str, jobs: int
+) -> Any:
+    generated_map = {}
+    with CreateProcessPool(jobs) as executor:
+        futures = {}
+        for group, (setting, zsh_template) in generate_targets.items():
+            futures[group] = executor.submit(
+                GenerateTargetCommandCaptured,
+                group,
+                src_dir,
+                user_dir,
+                setting,
+                zsh_template,
+            )
+        for group, future in futures.items():
+            is_generated, output = future.result()
+            print(output, end="")
+            generated_map[group] = is_generated
+    return generated_map
+
+
+def GenerateQueuedTargets(
+    generate_targets: Any,
+    cmd_status_list: Any,
+    group_digests: Any,
+    src_dir: str,
+    user_dir_index: UserDirIndex,
+    jobs: int,
+) -> None:
+    generated_map = GenerateTargetCommandsParallel(
+        {
+            group: (setting, zsh_template)
+            for group, (setting, _, zsh_template) in generate_targets.items()
+        },
+        src_dir,
+        user_dir_index.user_dir,
+        jobs,
+    )
+    for group, is_generated in generated_map.items():
+        if not is_generated:
+            cmd_status_list[group].update_state = CommandUpdateState.NoChange
+        user_dir_index.AddGroup(group)
+        group_digests[group] = generate_targets[group][1]
+    generate_targets.clear()
+
+
+def UpdateAliasIndex(groups: Any, user_dir: str, is_enabled: bool) -> None:
+    index_path = alias_index.GetAliasIndexPath(f"{user_dir}/json")
+    if not is_enabled:
+        if os.path.exists(index_path):
+            print(f"[INFO] Remove alias index: \033[34m{index_path}\033[0m\n")
+            os.remove(index_path)
+        return
+
+    group_keys = {}
+    for group in groups:
+        group_keys[group] = group_commands.GetCommandCacheKey(
+            f"{user_dir}/json/{group}.json"
+        )
+    # Groups indexed with their current cache key keep their records; only
+    # the others are loaded, one at a time.
+    records = []
+    unchanged_groups = set()
+    try:
+        with alias_index.AliasIndex(index_path) as index:
+            group_keys_old = index.GetGroupKeys()
+            for group, cache_key in group_keys.items():
+                if group_keys_old.get(group) == alias_index.FormatCacheKey(cache_key):
+                    unchanged_groups.add(group)
+            if unchanged_groups == set(group_keys_old) == set(group_keys):
+                return
+            records = index.GetRecords(unchanged_groups)
+    except (OSError, ValueError):
+        pass
+
+    for group, cache_key in group_keys.items():
+        if group in unchanged_groups:
+            continue
+        try:
+            commands, _, _ = group_commands.LoadCommandSetting(
+                f"{user_dir}/json/{group}.json"
+            )
+        except SystemExit:
+            continue
+        records += alias_index.GetGroupRecords(group, cache_key, commands)
+    alias_index.DumpAliasIndex(records, index_path)
+    print(f"[INFO] Update alias index: \033[34m{index_path}\033[0m\n")
+
+
 def EraceTargetCommand(group: str, user_dir: str) -> None:
     print(f"[INFO] Remove {group}")
     if os.path.lexists(f"{user_dir}/{group}"):
         os.remove(f"{user_dir}/{group}")
-    if os.path.exists(f"{user_dir}/json/{group}.json"):
-        os.remove(f"{user_dir}/json/{group}.json")
+    for suffix in [".json", ".cache", ".suggest", ".help", ".complete"]:
+        if os.path.exists(f"{user_dir}/json/{group}{suffix}"):
+            os.remove(f"{user_dir}/json/{group}{suffix}")
     if os.path.exists(f"{user_dir}/zsh_func/_{group}"):
         os.remove(f"{user_dir}/zsh_func/_{group}")
     return
@@ -335,24 +958,98 @@ def ShowPathSettingSummary(is_ok_PATH: bool, is_ok_fpath: bool) -> None:
     return
 
 
+def ShowJsonSummary(cmd_status_list: Any, is_ok_PATH: bool, is_ok_fpath: bool) -> None:
+    availability_names = {
+        CommandAvailability.Empty: "empty",
+        CommandAvailability.Available: "OK",
+        CommandAvailability.Broken: "broken",
+    }
+    state_names = {
+        CommandUpdateState.NoChange: "no change",
+        CommandUpdateState.Updated: "updated",
+        CommandUpdateState.New: "new",
+        CommandUpdateState.Removed: "removed",
+    }
+    summary = {"groups": {}, "path": is_ok_PATH, "fpath": is_ok_fpath}
+    for group, cmd_status in sorted(cmd_status_list.items()):
+        summary["groups"][group] = {
+            "available": availability_names[cmd_status.availability],
+            "config": cmd_status.has_config,
+            "state": state_names[cmd_status.update_state],
+        }
+    print(json.dumps(summary, indent=2))
+    return
+
+
 def CheckEnvPath(user_dir: str) -> bool:
     is_ok_PATH = user_dir in str(os.environ.get("PATH"))
     return is_ok_PATH
 
 
+def GetZshRcKey() -> Any:
+    rc_key = {"SHELL": str(os.environ.get("SHELL"))}
+    for rc_file in ZSH_RC_FILES:
+        try:
+            rc_key[rc_file] = os.stat(os.path.expanduser(rc_file)).st_mtime_ns
+        except OSError:
+            rc_key[rc_file] = None
+    return rc_key
+
+
+def ScanZshRcFPATH(user_dir: str) -> bool:
+    # Cheap check for the line recommended by ShowSettingRecommendation.
+    home_dir = os.path.expanduser("~")
+    zsh_func_dirs = [f"{user_dir}/zsh_func"]
+    if user_dir.startswith(f"{home_dir}/"):
+        user_dir_rel = user_dir[len(home_dir) :]
+        zsh_func_dirs += [f"~{user_dir_rel}/zsh_func", f"$HOME{user_dir_rel}/zsh_func"]
+    for rc_file in ZSH_RC_FILES:
+        try:
+            with open(os.path.expanduser(rc_file), "r", errors="replace") as file:
+                lines = file.readlines()
+        except OSError:
+            continue
+        for line in lines:
+            line = line.strip()
+            if line.startswith("#") or "fpath" not in line:
+                continue
+            if any(zsh_func_dir in line for zsh_func_dir in zsh_func_dirs):
+                return True
+    return False
+
+
 def CheckZshFPATH(user_dir: str, src_dir: str) -> bool:
-    is_ok_fpath = False
-    if "zsh" in str(os.environ.get("SHELL")):
+    if not "zsh" in str(os.environ.get("SHELL")):
+        return True
+
+    rc_key = GetZshRcKey()
+    fpath_cache_file = f"{user_dir}/{FPATH_CACHE_NAME}"
+    try:
+        with open(fpath_cache_file, "r", encoding="utf-8") as file:
+            fpath_cache = json.load(file)
+        if fpath_cache["key"] == rc_key and fpath_cache["user_dir"] == user_dir:
+            return fpath_cache["is_ok_fpath"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    is_ok_fpath = ScanZshRcFPATH(user_dir)
+    if not is_ok_fpath:
+        # Runs alongside the -i prompts, so rc files must not read the tty.
         proc = subprocess.run(
             [f"{src_dir}/get_fpath.zsh"],
             shell=True,
+            stdin=subprocess.DEVNULL,
             stdout=PIPE,
             stderr=PIPE,
             text=True,
         )
         is_ok_fpath = f"{user_dir}/zsh_func" in proc.stdout
-    else:
-        is_ok_fpath = True
+
+    if os.path.isdir(user_dir):
+        fpath_cache = {"key": rc_key, "user_dir": user_dir, "is_ok_fpath": is_ok_fpath}
+        with open(f"{fpath_cache_file}.tmp", mode="wt", encoding="utf-8") as file:
+            json.dump(fpath_cache, file)
+        os.replace(f"{fpath_cache_file}.tmp", fpath_cache_file)
     return is_ok_fpath
 
 
@@ -374,24 +1071,323 @@ def ShowSettingRecommendation(
     return
 
 
-def ShowCommandHelp(cmd_status_list: Any, user_dir: str) -> None:
+def GetCommandHelp(group: str, user_dir: str) -> str:
+    command_list_json = f"{user_dir}/json/{group}.json"
+    try:
+        commands, group_name, discription = group_commands.LoadCommandSetting(
+            command_list_json
+        )
+    except SystemExit as e:
+        return f"[ERROR] \033[31m{e.code}\033[0m\n"
+    return group_commands.GetHelpText(
+        commands, group_name, discription, command_list_json
+    )
+
+
+def GetShownGroups(cmd_status_list: Any, group_patterns: Any) -> Any:
+    groups = []
     for group in sorted(cmd_status_list.keys()):
-        if cmd_status_list[group].availability == CommandAvailability.Available:
-            group_bold = f"\033[1m{group}\033[0m"
-            print(f"------------------ {group_bold} ------------------\n")
-            subprocess.run([f"{user_dir}/{group} -h"], shell=True)
-            print()
+        if cmd_status_list[group].availability != CommandAvailability.Available:
+            continue
+        if group_patterns and not any(
+            fnmatch.fnmatchcase(group, pattern) for pattern in group_patterns
+        ):
+            continue
+        groups.append(group)
+    return groups
+
+
+def ShowCommandHelp(
+    cmd_status_list: Any, user_dir: str, group_patterns: Any, jobs: int
+) -> None:
+    groups = GetShownGroups(cmd_status_list, group_patterns)
+
+    if jobs > 1:
+        executor = CreateProcessPool(jobs)
+        help_messages = executor.map(
+            GetCommandHelp, groups, [user_dir] * len(groups), chunksize=8
+        )
+    else:
+        executor = None
+        help_messages = (GetCommandHelp(group, user_dir) for group in groups)
+
+    for group, help_message in zip(groups, help_messages):
+        group_bold = f"\033[1m{group}\033[0m"
+        print(f"------------------ {group_bold} ------------------\n")
+        print(help_message, end="", flush=True)
+        print()
+
+    if executor is not None:
+        executor.shutdown()
+    return
+
+
+def GetStatsEntryName(command: str, arg: str) -> str:
+    if not command:
+        return "(no command)"
+    return f"{command} {arg}" if arg else command
+
+
+def GetCommandStats(group: str, user_dir: str, top: int) -> str:
+    records = stats.ReadStatsRecords(f"{user_dir}/{stats.STATS_DIR_NAME}", group)
+    if not records:
+        return "no calls recorded\n"
+
+    # Lines only shown (-s, -c) or answered by the output cache are counted
+    # apart and left out of the latency of runs.
+    outcomes = {}
+    durations = {}
+    mistypes = {}
+    all_durations = []
+    for command, arg, outcome, status, duration_ms in records:
+        if outcome == "resolved" and status in ("shown", "cached"):
+            outcome = status
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        entry = GetStatsEntryName(command, arg)
+        if outcome == "suggested":
+            mistypes[entry] = mistypes.get(entry, 0) + 1
+        elif outcome not in ("shown", "cached"):
+            durations.setdefault(entry, []).append(duration_ms)
+            all_durations.append(duration_ms)
+    all_durations.sort()
+
+    lines = [
+        f"calls: {len(records)} ("
+        + ", ".join(f"{outcome} {count}" for outcome, count in sorted(outcomes.items()))
+        + ")",
+        "latency ms: "
+        + "  ".join(
+            f"p{percent} {stats.Percentile(all_durations, percent):.2f}"
+            for percent in (50, 95, 99)
+        )
+        if all_durations
+        else "latency ms: -",
+        "",
+        f"{'calls':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  entry",
+    ]
+    hot_entries = sorted(durations.items(), key=lambda item: -len(item[1]))
+    for entry, values in hot_entries[:top]:
+        values.sort()
+        p50, p95, p99 = (stats.Percentile(values, p) for p in (50, 95, 99))
+        lines.append(f"{len(values):7} {p50:9.2f} {p95:9.2f} {p99:9.2f}  {entry}")
+
+    if mistypes:
+        lines += ["", "most mistyped:"]
+        for entry, count in sorted(mistypes.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"{count:7}  {entry}")
+
+    command_list_json = f"{user_dir}/json/{group}.json"
+    try:
+        commands = group_commands.LoadCommandSetting(command_list_json)[0]
+    except SystemExit as e:
+        lines += ["", f"[ERROR] \033[31m{e.code}\033[0m"]
+        return "\n".join(lines) + "\n"
+    # A command counts as used when it or any of its arguments resolved.
+    used = set()
+    for command, arg, outcome, _, _ in records:
+        if outcome == "resolved":
+            used.add((command, arg))
+            used.add((command, None))
+    unused = []
+    for cmd, cmd_v in commands.items():
+        if cmd == "help":
+            continue
+        if (cmd, None) not in used:
+            unused.append(cmd)
+            continue
+        unused += [
+            GetStatsEntryName(cmd, arg) for arg in cmd_v[2] if (cmd, arg) not in used
+        ]
+    if unused:
+        lines += ["", f"unused entries: {len(unused)}"]
+        lines += [f"         {entry}" for entry in unused]
+    return "\n".join(lines) + "\n"
+
+
+def ShowCommandStats(
+    cmd_status_list: Any, user_dir: str, group_patterns: Any, top: int
+) -> None:
+    for group in GetShownGroups(cmd_status_list, group_patterns):
+        group_bold = f"\033[1m{group}\033[0m"
+        print(f"------------------ {group_bold} ------------------\n")
+        print(GetCommandStats(group, user_dir, top), flush=True)
     return
 
 
+def RegenerateChangedGroups(
+    json_file_path: str,
+    settings_old: Any,
+    group_digests: Any,
+    generation_digest: str,
+    src_dir: str,
+    user_dir: str,
+    args: Any,
+) -> Any:
+    # Returns the new settings and their shards, or the old ones while the json
+    # does not load, so a half-written save is reported and then compared
+    # against again.
+    try:
+        settings, shard_paths = timing.Call(
+            "load_json",
+            LoadCommandGroups,
+            json_file_path,
+            GetShardCacheDir(user_dir),
+            args.jobs,
+        )
+    except SystemExit as e:
+        print(e.code, file=sys.stderr, flush=True)
+        return settings_old, None
+
+    user_dir_index = timing.Call("status_scan", UserDirIndex, user_dir)
+    generate_targets = {}
+    for group, setting in settings.items():
+        group_digest = GetGroupDigest(setting, generation_digest)
+        if group_digests.get(group) == group_digest and user_dir_index.IsAvailable(
+            group
+        ):
+            continue
+        zsh_template = GetZshTemplateName(setting, args.completion)
+        generate_targets[group] = setting, group_digest, zsh_template
+    removed_groups = [group for group in settings_old if group not in settings]
+    if not generate_targets and not removed_groups:
+        return settings, shard_paths
+
+    if args.jobs > 1 and len(generate_targets) > 1:
+        timing.Call(
+            "generate_parallel",
+            GenerateTargetCommandsParallel,
+            {
+                group: (setting, zsh_template)
+                for group, (setting, _, zsh_template) in generate_targets.items()
+            },
+            src_dir,
+            user_dir,
+            args.jobs,
+        )
+    else:
+        for group, (setting, _, zsh_template) in generate_targets.items():
+            timing.Call(
+                "generate",
+                GenerateTargetCommand,
+                group,
+                src_dir,
+                user_dir,
+                setting,
+                zsh_template,
+            )
+    for group, (_, group_digest, _) in generate_targets.items():
+        user_dir_index.AddGroup(group)
+        group_digests[group] = group_digest
+    # Like a normal run, groups left without config are only removed with -r
+    # (and after asking with -i).
+    num_removed = 0
+    for group in removed_groups:
+        group_bold = f"\033[1m{group}\033[0m"
+        if not args.remove:
+            print(f"[INFO] {group_bold} has no config. Run with -r to remove it.")
+            continue
+        ask_str = f"[INFO] {group_bold} has no config. Do you remove {group_bold}?"
+        if args.interactive and not yes_or_no(ask_str):
+            continue
+        EraceTargetCommand(group, user_dir)
+        user_dir_index.RemoveGroup(group)
+        group_digests.pop(group, None)
+        num_removed += 1
+
+    timing.Call("manifest", DumpManifest, user_dir, group_digests)
+    available_groups = sorted(
+        group
+        for group in user_dir_index.entries
+        if user_dir_index.IsAvailable(group)
+    )
+    timing.Call(
+        "alias_index",
+        UpdateAliasIndex,
+        available_groups,
+        user_dir,
+        not args.no_alias_index,
+    )
+    print(
+        f"[INFO] Regenerated {len(generate_targets)} and removed "
+        f"{num_removed} command groups.\n",
+        flush=True,
+    )
+    return settings, shard_paths
+
+
+def GetWatchPaths(json_file_path: str, shard_paths: Any) -> Any:
+    # The shards, plus the directory new shards would appear in.
+    if IsGlobPattern(json_file_path):
+        base_dir = json_file_path
+        while IsGlobPattern(base_dir):
+            base_dir = os.path.dirname(base_dir)
+        return [base_dir or "."] + shard_paths
+    elif os.path.isdir(json_file_path):
+        return [json_file_path] + shard_paths
+    return shard_paths
+
+
+def WatchCommandGroups(
+    json_file_path: str, src_dir: str, user_dir: str, args: Any
+) -> int:
+    # Templates stay cached by GetZshFunctionTemplate and the previous
+    # settings are kept to spot removed groups, so each save costs one parse
+    # plus the changed groups.
+    generation_digest = GetGenerationDigest(src_dir, args.completion)
+    group_digests = LoadManifest(user_dir)
+    settings, shard_paths = LoadCommandGroups(
+        json_file_path, GetShardCacheDir(user_dir), args.jobs
+    )
+    watch_paths = GetWatchPaths(json_file_path, shard_paths)
+    watcher = watch.OpenWatcher(watch_paths, WATCH_POLL_INTERVAL)
+    print(
+        f"[INFO] Watching \033[34m{json_file_path}\033[0m ({watcher.kind}). "
+        "Press Ctrl-C to stop.\n",
+        flush=True,
+    )
+    try:
+        while True:
+            watch.WaitChange(watcher, WATCH_DEBOUNCE)
+            with timing.Phase("watch_cycle"):
+                settings, shard_paths = RegenerateChangedGroups(
+                    json_file_path,
+                    settings,
+                    group_digests,
+                    generation_digest,
+                    src_dir,
+                    user_dir,
+                    args,
+                )
+            # Includes may have added or dropped shards.
+            if shard_paths is not None:
+                new_watch_paths = GetWatchPaths(json_file_path, shard_paths)
+                if new_watch_paths != watch_paths:
+                    watcher.Close()
+                    watch_paths = new_watch_paths
+                    watcher = watch.OpenWatcher(watch_paths, WATCH_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        print()
+    finally:
+        watcher.Close()
+    return 0
+
+
 def main() -> int:
     args = ParseArgs()
-    if args.show_commands:
+    timing.Start(args.profile)
+    if args.json_summary and not args.check_only:
+        # The generation log would be mixed into the json on stdout.
+        error_message = "[ERROR] \033[31m--json_summary can only be used with -c.\033[0m"
+        sys.exit(error_message)
+    if args.show_commands or args.stats:
         args.check_only = True
+    if args.watch and args.check_only:
+        error_message = "[ERROR] \033[31m--watch cannot be used with -c, -s or --stats.\033[0m"
+        sys.exit(error_message)
 
     if args.version:
         prog = str(Path(sys.argv[0]).stem)
-        print(f"{prog}: version 0.0")
+        print(f"{prog}: version {VERSION}")
         return 0
 
     parent_dir = pathlib.Path(os.path.abspath(__file__)).parent
@@ -409,31 +1405,48 @@ def main() -> int:
     json_file_path = f"{parent_dir}/commands.json"
     if args.json:
         json_file_path = args.json
-    if not os.path.exists(json_file_path):
+    if IsGlobPattern(json_file_path) or os.path.isdir(json_file_path):
+        GetInputPaths(json_file_path)
+    elif not os.path.exists(json_file_path):
         shutil.copyfile(f"{parent_dir}/src/commands.json", json_file_path)
         error_message = f"[ERROR] \033[31mNo input json.\033[0m\n"
         error_message += f"[INFO] Create \033[34m{json_file_path}\033[0m."
         sys.exit(error_message)
 
+    env_check_executor = ThreadPoolExecutor(max_workers=2)
+    is_ok_PATH_future = env_check_executor.submit(
+        timing.Call, "check_path", CheckEnvPath, user_dir
+    )
+    is_ok_fpath_future = env_check_executor.submit(
+        timing.Call, "check_fpath", CheckZshFPATH, user_dir, src_dir
+    )
+    env_check_executor.shutdown(wait=False)
+
     if not args.check_only:
         CheckUserDirectory(user_dir, args.verbose)
-    cmd_status_list = FetchCommandFileStatusMap(user_dir)
+    user_dir_index = timing.Call("status_scan", UserDirIndex, user_dir)
+    cmd_status_list = FetchCommandFileStatusMap(user_dir_index)
 
     for group in cmd_status_list:
-        if not CheckAvailability(user_dir, group):
+        if not user_dir_index.IsAvailable(group):
             cmd_status_list[group].availability = CommandAvailability.Broken
 
-    json_load_list = LoadJsonFile(json_file_path)
-    for json_load in json_load_list:
-        if not "group" in json_load:
-            error_message = f"[ERROR] \033[31mAn item with no group exists in json input.\033[0m \nPlease fix \033[34m{json_file_path}\033[0m."
-            sys.exit(error_message)
-
-        group = json_load["group"]
-
-        if not "commands" in json_load or not json_load["commands"]:
-            error_message = f"[ERROR] \033[31mNo commands in {group}.\033[0m \nPlease fix \033[34m{json_file_path}\033[0m."
-            sys.exit(error_message)
+    group_digests = LoadManifest(user_dir) if not args.force else {}
+    group_digests_old = dict(group_digests)
+    generation_digest = GetGenerationDigest(src_dir, args.completion)
+    generate_targets = {}
+    if args.stream:
+        config_items = timing.IterItems("load_json", IterConfigItems(json_file_path))
+    else:
+        config_items = timing.Call(
+            "load_json",
+            LoadConfigItems,
+            json_file_path,
+            GetShardCacheDir(user_dir),
+            args.jobs,
+        )
+    for setting in config_items:
+        group = setting[1]
 
         is_existing = group in cmd_status_list
         if not is_existing:
@@ -443,21 +1456,70 @@ def main() -> int:
         if args.check_only:
             continue
 
-        is_generated = False
+        group_digest = timing.Call(
+            "digest", GetGroupDigest, setting, generation_digest
+        )
+        if (
+            is_existing
+            and cmd_status_list[group].availability != CommandAvailability.Broken
+            and group_digests.get(group) == group_digest
+        ):
+            print(f"[INFO] Generate command group: \033[1m{group}\033[0m")
+            print(f"[INFO] \033[33mNo change.\033[0m\n")
+            continue
+        group_digests.pop(group, None)
+
         if is_existing:
             group_bold = f"\033[1m{group}\033[0m"
             ask_str = f"[INFO] {group_bold} already exists. Do you want to update?"
             if not args.interactive or yes_or_no(ask_str):
                 cmd_status_list[group].update_state = CommandUpdateState.Updated
-                is_generated = GenerateTargetCommand(
-                    group, src_dir, user_dir, json_load
-                )
+            else:
+                continue
         else:
             cmd_status_list[group].update_state = CommandUpdateState.New
-            is_generated = GenerateTargetCommand(group, src_dir, user_dir, json_load)
 
+        zsh_template = GetZshTemplateName(setting, args.completion)
+        if args.jobs > 1:
+            generate_targets[group] = setting, group_digest, zsh_template
+            if args.stream and len(generate_targets) >= args.jobs * 4:
+                timing.Call(
+                    "generate_parallel",
+                    GenerateQueuedTargets,
+                    generate_targets,
+                    cmd_status_list,
+                    group_digests,
+                    src_dir,
+                    user_dir_index,
+                    args.jobs,
+                )
+            continue
+
+        is_generated = timing.Call(
+            "generate",
+            GenerateTargetCommand,
+            group,
+            src_dir,
+            user_dir,
+            setting,
+            zsh_template,
+        )
         if not is_generated:
             cmd_status_list[group].update_state = CommandUpdateState.NoChange
+        user_dir_index.AddGroup(group)
+        group_digests[group] = group_digest
+
+    if generate_targets:
+        timing.Call(
+            "generate_parallel",
+            GenerateQueuedTargets,
+            generate_targets,
+            cmd_status_list,
+            group_digests,
+            src_dir,
+            user_dir_index,
+            args.jobs,
+        )
 
     if args.remove:
         for group in cmd_status_list.keys():
@@ -469,25 +1531,65 @@ def main() -> int:
                 if not args.interactive or yes_or_no(ask_str):
                     cmd_status_list[group].update_state = CommandUpdateState.Removed
                     EraceTargetCommand(group, user_dir)
+                    user_dir_index.RemoveGroup(group)
+                    group_digests.pop(group, None)
                 print()
 
+    for group in list(group_digests.keys()):
+        if group not in cmd_status_list:
+            group_digests.pop(group)
+    if not args.check_only and group_digests != group_digests_old:
+        timing.Call("manifest", DumpManifest, user_dir, group_digests)
+
     for group in cmd_status_list.keys():
-        if CheckAvailability(user_dir, group):
+        if user_dir_index.IsAvailable(group):
             cmd_status_list[group].availability = CommandAvailability.Available
 
+    if not args.check_only:
+        available_groups = [
+            group
+            for group in sorted(cmd_status_list.keys())
+            if cmd_status_list[group].availability == CommandAvailability.Available
+        ]
+        timing.Call(
+            "alias_index",
+            UpdateAliasIndex,
+            available_groups,
+            user_dir,
+            not args.no_alias_index,
+        )
+
     ShowCommandGenerationResult(cmd_status_list, args.verbose)
 
-    is_ok_PATH = CheckEnvPath(user_dir)
-    is_ok_fpath = CheckZshFPATH(user_dir, src_dir)
-    ShowCommandFileStatusListSummary(cmd_status_list)
-    ShowPathSettingSummary(is_ok_PATH, is_ok_fpath)
+    with timing.Phase("wait_env_check"):
+        is_ok_PATH = is_ok_PATH_future.result()
+        is_ok_fpath = is_ok_fpath_future.result()
+    if args.json_summary:
+        ShowJsonSummary(cmd_status_list, is_ok_PATH, is_ok_fpath)
+    else:
+        ShowCommandFileStatusListSummary(cmd_status_list)
+        ShowPathSettingSummary(is_ok_PATH, is_ok_fpath)
 
     if not args.check_only:
         ShowSettingRecommendation(is_ok_PATH, is_ok_fpath, user_dir)
 
     if args.show_commands:
-        ShowCommandHelp(cmd_status_list, user_dir)
+        timing.Call(
+            "show_help", ShowCommandHelp, cmd_status_list, user_dir, args.group, args.jobs
+        )
+
+    if args.stats:
+        timing.Call(
+            "show_stats",
+            ShowCommandStats,
+            cmd_status_list,
+            user_dir,
+            args.group,
+            args.top,
+        )
 
+    if args.watch:
+        return WatchCommandGroups(json_file_path, src_dir, user_dir, args)
     return 0
 
 
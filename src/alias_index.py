@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import zlib
+
+# Imported on every alias dispatch, so typing stays out of the import path.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any
+
+# One file for all command groups, read through mmap so resolving an alias
+# touches a few pages instead of decoding a whole group.
+#
+#   header : magic, version, slot count, string table offset, group table
+#            offset, group count
+#   slots  : hash, key offset, key length, value offset, value length, flags
+#   groups : key offset, key length, value offset, value length
+#   strings: utf-8 keys and lines, each distinct string stored once
+#
+# Keys are "group", "group\0cmd" and "group\0cmd\0arg". A group record holds
+# the cache key of its json, a command record its line and whether it has
+# arguments (if not, no argument is looked up), an argument record its line.
+# Command and argument records are flagged when their output is cached.
+#
+# The records of a group whose cache key did not change are copied from the
+# current index, so an update only loads the groups that were regenerated.
+# The group table lists the group records, so checking which groups changed
+# does not scan the slots.
+
+ALIAS_INDEX_NAME = ".alias_index"
+ALIAS_INDEX_MAGIC = b"CZAI"
+ALIAS_INDEX_VERSION = 2
+HEADER = struct.Struct("<4sIIIII")
+SLOT = struct.Struct("<IIIIII")
+GROUP = struct.Struct("<IIII")
+FLAG_HAS_ARGS = 1
+FLAG_CACHED = 2
+
+
+def GetAliasIndexPath(user_json_dir: str) -> str:
+    return f"{user_json_dir}/{ALIAS_INDEX_NAME}"
+
+
+def GetRecordKey(*names: str) -> bytes:
+    return "\0".join(names).encode()
+
+
+def FormatCacheKey(cache_key: Any) -> bytes:
+    return ":".join(str(value) for value in cache_key).encode()
+
+
+def GetGroupRecords(group: str, cache_key: Any, commands: Any) -> Any:
+    # (key, value, flags) of a group and its commands and arguments.
+    records = [(GetRecordKey(group), FormatCacheKey(cache_key), 0)]
+    for cmd, cmd_v in commands.items():
+        cmd_line, args, cmd_options = cmd_v[1:4]
+        is_cached = bool(cmd_options and "cache" in cmd_options)
+        flags = FLAG_HAS_ARGS if args else 0
+        flags |= FLAG_CACHED if is_cached else 0
+        records.append((GetRecordKey(group, cmd), cmd_line.encode(), flags))
+        for arg, arg_v in args.items():
+            arg_line, arg_options = arg_v[1], arg_v[2]
+            if is_cached or (arg_options and "cache" in arg_options):
+                flags = FLAG_CACHED
+            else:
+                flags = 0
+            key = GetRecordKey(group, cmd, arg)
+            records.append((key, arg_line.encode(), flags))
+    return records
+
+
+def BuildAliasIndex(records: Any) -> bytes:
+    slot_count = 8
+    while slot_count < len(records) * 2:
+        slot_count *= 2
+    groups_offset = HEADER.size + SLOT.size * slot_count
+    group_count = sum(1 for key, _, _ in records if b"\0" not in key)
+    strings_offset = groups_offset + GROUP.size * group_count
+    strings = bytearray()
+    string_offsets = {}
+
+    def AddString(value: bytes) -> int:
+        if value not in string_offsets:
+            string_offsets[value] = strings_offset + len(strings)
+            strings.extend(value)
+        return string_offsets[value]
+
+    slots = [None] * slot_count
+    groups = []
+    for key, value, flags in records:
+        key_hash = zlib.crc32(key)
+        i = key_hash & (slot_count - 1)
+        while slots[i] is not None:
+            i = (i + 1) & (slot_count - 1)
+        slots[i] = (
+            key_hash,
+            AddString(key),
+            len(key),
+            AddString(value),
+            len(value),
+            flags,
+        )
+        if b"\0" not in key:
+            groups.append(slots[i][1:5])
+
+    data = bytearray(strings_offset)
+    HEADER.pack_into(
+        data,
+        0,
+        ALIAS_INDEX_MAGIC,
+        ALIAS_INDEX_VERSION,
+        slot_count,
+        strings_offset,
+        groups_offset,
+        group_count,
+    )
+    for i, slot in enumerate(slots):
+        if slot is not None:
+            SLOT.pack_into(data, HEADER.size + SLOT.size * i, *slot)
+    for i, group in enumerate(groups):
+        GROUP.pack_into(data, groups_offset + GROUP.size * i, *group)
+    data.extend(strings)
+    return bytes(data)
+
+
+def DumpAliasIndex(records: Any, index_path: str) -> None:
+    with open(f"{index_path}.tmp", mode="wb") as file:
+        file.write(BuildAliasIndex(records))
+    # Readers keep the old file mapped until they are done with it.
+    os.replace(f"{index_path}.tmp", index_path)
+
+
+class AliasIndex:
+    def __init__(self, index_path: str) -> None:
+        with open(index_path, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            header = HEADER.unpack_from(self.buffer, 0)
+        except struct.error:
+            header = None, None, 0, 0, 0, 0
+        magic, version, self.slot_count, _, self.groups_offset, group_count = header
+        self.group_count = group_count
+        if magic != ALIAS_INDEX_MAGIC or version != ALIAS_INDEX_VERSION:
+            self.buffer.close()
+            raise ValueError(f"{index_path} is not an alias index")
+
+    def __enter__(self) -> AliasIndex:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.buffer.close()
+
+    def Lookup(self, key: bytes) -> Any:
+        # Returns (value, flags), or None when the key is not indexed.
+        key_hash = zlib.crc32(key)
+        mask = self.slot_count - 1
+        i = key_hash & mask
+        while True:
+            slot = SLOT.unpack_from(self.buffer, HEADER.size + SLOT.size * i)
+            slot_hash, key_offset, key_size, value_offset, value_size, flags = slot
+            if key_size == 0:
+                return None
+            if (
+                slot_hash == key_hash
+                and self.buffer[key_offset : key_offset + key_size] == key
+            ):
+                return self.buffer[value_offset : value_offset + value_size], flags
+            i = (i + 1) & mask
+
+    def IsGroupCurrent(self, group: str, cache_key: Any) -> bool:
+        record = self.Lookup(GetRecordKey(group))
+        return record is not None and record[0] == FormatCacheKey(cache_key)
+
+    def IterRecords(self) -> Any:
+        for i in range(self.slot_count):
+            slot = SLOT.unpack_from(self.buffer, HEADER.size + SLOT.size * i)
+            _, key_offset, key_size, value_offset, value_size, flags = slot
+            if key_size:
+                key = self.buffer[key_offset : key_offset + key_size]
+                value = self.buffer[value_offset : value_offset + value_size]
+                yield key, value, flags
+
+    def GetGroupKeys(self) -> Any:
+        # {group: formatted cache key}, read from the group table.
+        group_keys = {}
+        for i in range(self.group_count):
+            group = GROUP.unpack_from(self.buffer, self.groups_offset + GROUP.size * i)
+            key_offset, key_size, value_offset, value_size = group
+            key = self.buffer[key_offset : key_offset + key_size].decode()
+            group_keys[key] = self.buffer[value_offset : value_offset + value_size]
+        return group_keys
+
+    def GetRecords(self, groups: Any) -> Any:
+        # Records of the given groups, to carry them over into a new index.
+        group_names = {GetRecordKey(group) for group in groups}
+        return [
+            record
+            for record in self.IterRecords()
+            if record[0].split(b"\0", 1)[0] in group_names
+        ]
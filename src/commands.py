@@ -1,20 +1,27 @@
 #!/usr/bin/env python3.9
 
-import argparse
-import clipboard
-import difflib
-import json
+from __future__ import annotations
+
+import marshal
 import os
-import pathlib
-import subprocess
 import sys
-from subprocess import PIPE
-from typing import Any
+
+import stats
+import timing
+
+# argparse, clipboard, config (and json), difflib and the indexes are imported
+# on the paths that need them, so a plain dispatch only pays for os, sys,
+# marshal, stats and timing.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any
 
 
 def AplyArgParser(
     group: str, desc: str, help_epilog_str: str, json_file_path: str
 ) -> Any:
+    import argparse
+
     desc_str = "The command {group} provides git-command-like alias.\n"
     if desc:
         desc_str = f"{desc}\n"
@@ -43,34 +50,76 @@ def AplyArgParser(
         required=False,
         help="only show and copy to clipboard",
     )
+    argparser.add_argument(
+        "--no_cache",
+        action="store_true",
+        required=False,
+        help="run without reading or writing the output cache",
+    )
+    argparser.add_argument(
+        "--refresh_cache",
+        action="store_true",
+        required=False,
+        help="run and replace the cached output",
+    )
+    argparser.add_argument(
+        "--batch",
+        type=str,
+        metavar="FILE",
+        required=False,
+        help="run 'command argument...' of each line in FILE (- for stdin)",
+    )
+    argparser.add_argument(
+        "--parallel",
+        type=int,
+        metavar="N",
+        required=False,
+        help="jobs run at once: --batch lines (default 1), steps (default all)",
+    )
     return argparser
 
 
-def IsJson(json_str: str) -> bool:
-    file_open = open(json_str, "r")
-    try:
-        json_obj = json.loads(file_open.read())
-    except ValueError as e:
-        return False
-    return True
-
-
 def GetSimilarOne(target: str, lists: Any) -> Any:
-    candidates_with_score = {}
+    import difflib
+
+    candidates_with_score = []
     for cmd in lists:
-        is_similar = False
         score = difflib.SequenceMatcher(None, target, cmd).ratio()
         if score > 0.2:
-            candidates_with_score[score] = cmd
+            candidates_with_score.append((-score, cmd))
 
     candidates = []
-    for key, cmd in sorted(candidates_with_score.items(), reverse=True):
+    for key, cmd in sorted(candidates_with_score):
         candidates.append(cmd)
 
     max_to_show_similar_args = 5
     return candidates[:max_to_show_similar_args]
 
 
+def GetSimilarCandidates(
+    target: str, lists: Any, command_list_json: str, table_name: str
+) -> Any:
+    with timing.Phase("suggest"):
+        return GetSimilarCandidatesIndexed(
+            target, lists, command_list_json, table_name
+        )
+
+
+def GetSimilarCandidatesIndexed(
+    target: str, lists: Any, command_list_json: str, table_name: str
+) -> Any:
+    import suggest
+
+    try:
+        cache_key = GetCommandCacheKey(command_list_json)
+    except OSError:
+        return GetSimilarOne(target, lists)
+    table = suggest.ReadSuggestTable(command_list_json, cache_key, table_name)
+    if table is None:
+        return GetSimilarOne(target, lists)
+    return GetSimilarOne(target, suggest.GetShortlist(target, lists, table))
+
+
 def GetHelpString(commands: Any) -> str:
     help_epilog_str = "command list with argument:\n"
 
@@ -83,178 +132,932 @@ def GetHelpString(commands: Any) -> str:
         for arg_v in cmd_args.values():
             max_desc = max([max_desc, len(arg_v[0])])
 
-    for cmd_k, cmd_v in commands.items():
+    lines = [help_epilog_str]
+    for cmd_index, (cmd_k, cmd_v) in enumerate(commands.items(), 1):
         cmd_desc = cmd_v[0]
         cmd_line = cmd_v[1]
         cmd_args = cmd_v[2]
+        cmd_steps = GetCommandSteps(cmd_v)
         temp_str = cmd_k
         if cmd_desc:
             temp_str += f" ({cmd_desc})"
-        help_epilog_str += f"{list(commands.keys()).index(cmd_k) + 1}) {temp_str:{max_arg + max_desc + 9}}"
+        lines.append(f"{cmd_index}) {temp_str:{max_arg + max_desc + 9}}")
         if cmd_line:
-            help_epilog_str += f"--> {cmd_line}\n"
+            lines.append(f"--> {cmd_line}\n")
         else:
-            help_epilog_str += "\n"
+            lines.append("\n")
 
-        for arg_k, arg_v in cmd_args.items():
-            if list(cmd_args.keys()).index(arg_k) + 1 != len(cmd_args.items()):
+        num_items = len(cmd_args) + len(cmd_steps)
+        for arg_index, (arg_k, arg_v) in enumerate(cmd_args.items(), 1):
+            if arg_index != num_items:
                 tree_str = "├──"
             else:
                 tree_str = "└──"
-            help_epilog_str += f"   {tree_str} {arg_k:{max_arg + 2}}{arg_v[0]:{max_desc + 2}} --> {arg_v[1]}\n"
-        help_epilog_str += "\n"
+            lines.append(
+                f"   {tree_str} {arg_k:{max_arg + 2}}{arg_v[0]:{max_desc + 2}} --> {arg_v[1]}\n"
+            )
+        for step_index, (step, needs) in enumerate(cmd_steps, len(cmd_args) + 1):
+            if step_index != num_items:
+                tree_str = "├──"
+            else:
+                tree_str = "└──"
+            after_str = f" (after {', '.join(needs)})" if needs else ""
+            lines.append(f"   {tree_str} step: {step}{after_str}\n")
+        lines.append("\n")
+
+    return "".join(lines)
+
 
-    return help_epilog_str
+def GetCommandSteps(cmd_v: Any) -> Any:
+    cmd_options = cmd_v[3]
+    if cmd_options and "steps" in cmd_options:
+        return cmd_options["steps"]
+    return ()
+
+
+def FindStepCycle(steps: Any) -> Any:
+    needs_map = dict(steps)
+    visiting = []
+    visited = set()
+
+    def Visit(step: str) -> Any:
+        visiting.append(step)
+        for need in needs_map.get(step, ()):
+            if need in visiting:
+                return visiting[visiting.index(need) :] + [need]
+            if need not in visited:
+                cycle = Visit(need)
+                if cycle:
+                    return cycle
+        visiting.pop()
+        visited.add(step)
+        return None
+
+    for step in needs_map:
+        if step not in visited:
+            cycle = Visit(step)
+            if cycle:
+                return cycle
+    return None
+
+
+def GetStepsErrors(commands: Any, cmd: str) -> Any:
+    # Every problem with the steps of cmd, as messages.
+    import shlex
+
+    steps = GetCommandSteps(commands[cmd])
+    step_names = [step for step, _ in steps]
+    errors = []
+    if len(set(step_names)) != len(step_names):
+        errors.append(f"'{cmd}' has duplicate steps.")
+    for step, needs in steps:
+        try:
+            step_cmd = shlex.split(step)[0] if step.strip() else ""
+        except ValueError as e:
+            errors.append(f"step '{step}' of '{cmd}': {e}.")
+            step_cmd = None
+        if step_cmd is None:
+            pass
+        elif step_cmd not in commands or step_cmd == "help":
+            errors.append(f"step '{step}' of '{cmd}' is not a command of this group.")
+        elif GetCommandSteps(commands[step_cmd]):
+            errors.append(f"step '{step}' of '{cmd}' has steps itself.")
+        for need in needs:
+            if need not in step_names:
+                errors.append(
+                    f"'{need}' needed by step '{step}' of '{cmd}' is not a step."
+                )
+    cycle = FindStepCycle(steps)
+    if cycle:
+        errors.append(f"steps of '{cmd}' form a cycle: {' -> '.join(cycle)}.")
+    return errors
+
+
+def NormalizeCommandSetting(json_load: Any, command_list_json: str) -> Any:
+    import config
+
+    errors = []
+    setting = config.NormalizeGroupItem(json_load, (), errors)
+    if errors:
+        sys.exit(config.FormatConfigErrors(errors, command_list_json))
+    return setting
 
 
 def ReadCommandSetting(command_list_json: Any) -> Any:
-    if not IsJson(command_list_json):
-        error_message = f"'{command_list_json}' is not json format. \nPlease fix {command_list_json}."
-        sys.exit(error_message)
+    import config
 
-    json_open = open(command_list_json, "r")
-    json_load = json.load(json_open)
+    items, _, errors = config.LoadConfigFile(command_list_json, is_group_file=True)
+    if errors:
+        sys.exit(config.FormatConfigErrors(errors, command_list_json))
+    return items[0][1]
 
-    if not "group" in json_load.keys():
-        error_message = f"'group' key is required. \nPlease fix {command_list_json}."
-        sys.exit(error_message)
-    group = json_load["group"]
 
-    discription = (
-        json_load["description"] if ("description" in json_load.keys()) else ""
-    )
+COMMAND_CACHE_VERSION = 5
 
-    if not "commands" in json_load.keys():
-        error_message = f"'commands' key is required. \nPlease fix {command_list_json}."
-        sys.exit(error_message)
 
-    commands = {}
-    commands["help"] = "show help", "", {}
-
-    for command_elem in json_load["commands"]:
-        args = {}
-        if "args" in command_elem.keys():
-            for arg_elem in command_elem["args"]:
-                if "arg" in arg_elem:
-                    key = arg_elem["arg"]
-                    arg_elem_desc = (
-                        arg_elem["desc"] if ("desc" in arg_elem.keys()) else ""
-                    )
-                    arg_elem_line = (
-                        arg_elem["line"] if ("line" in arg_elem.keys()) else ""
-                    )
-                    args[key] = arg_elem_desc, arg_elem_line
-
-        if "cmd" in command_elem.keys():
-            cmd = command_elem["cmd"]
-            command_elem_desc = (
-                command_elem["desc"] if ("desc" in command_elem.keys()) else ""
-            )
-            command_elem_line = (
-                command_elem["line"] if ("line" in command_elem.keys()) else ""
-            )
+def GetCommandCachePath(command_list_json: str) -> str:
+    return f"{os.path.splitext(command_list_json)[0]}.cache"
 
-            if not args and not command_elem_line:
-                continue
-            commands[cmd] = command_elem_desc, command_elem_line, args
 
-    help_epilog_str = GetHelpString(commands)
-    return commands, group, discription, help_epilog_str
+def GetCommandCacheKey(command_list_json: str) -> Any:
+    stat = os.stat(command_list_json)
+    return COMMAND_CACHE_VERSION, stat.st_mtime_ns, stat.st_size
 
 
-def main() -> int:
-    # home_dir = os.path.expanduser("~")
-    json_parent = pathlib.Path(f"{__file__}").parent
-    json_stem = pathlib.Path(f"{__file__}").stem
-    command_list_json = f"{json_parent}/json/{json_stem}.json"
-    if not os.path.exists(command_list_json):
-        error_message = f"conf json {command_list_json} does not exists"
-        sys.exit(error_message)
+def ReadCommandCache(command_list_json: str) -> Any:
+    # The argument tables stay in the mapped file; see tables.py.
+    import tables
 
-    commands, group, discription, help_epilog_str = ReadCommandSetting(
-        command_list_json
-    )
+    try:
+        header, sections = tables.LoadSectionFile(
+            GetCommandCachePath(command_list_json)
+        )
+        key, commands, group, discription = header
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if key != GetCommandCacheKey(command_list_json):
+        return None
+    for cmd, (desc, line, (first, options), cmd_options) in commands.items():
+        buffers = [sections[first + i] for i in range(tables.ARG_TABLE_BUFFERS)]
+        args = tables.ArgTable.FromBuffers(buffers, options)
+        commands[cmd] = desc, line, args, cmd_options
+    return commands, group, discription
+
+
+def DumpCommandCache(
+    json_load: Any, command_list_json: str, setting: Any = None
+) -> bool:
+    # setting is the normalized json_load when the caller already has it.
+    import complete
+    import suggest
+    import tables
+
+    cache_key = GetCommandCacheKey(command_list_json)
+    if (
+        ReadCommandCache(command_list_json) is not None
+        and suggest.IsSuggestIndexValid(command_list_json, cache_key)
+        and ReadHelpCache(command_list_json) is not None
+        and complete.ReadCompleteIndex(command_list_json, cache_key) is not None
+    ):
+        return False
+    if setting is None:
+        setting = NormalizeCommandSetting(json_load, command_list_json)
+    commands, group, discription = setting
+    sections = []
+    cached_commands = {}
+    for cmd, (desc, line, args, cmd_options) in commands.items():
+        cached_commands[cmd] = desc, line, (len(sections), args.options), cmd_options
+        sections += args.GetBuffers()
+    header = cache_key, cached_commands, group, discription
+    tables.DumpSectionFile(GetCommandCachePath(command_list_json), header, sections)
+    suggest.DumpSuggestIndex(commands, cache_key, command_list_json)
+    DumpHelpCache(commands, group, discription, cache_key, command_list_json)
+    complete.DumpCompleteIndex(commands, cache_key, command_list_json)
+    return True
+
+
+HELP_CACHE_VERSION = 2
+
+
+def GetHelpCachePath(command_list_json: str) -> str:
+    return f"{os.path.splitext(command_list_json)[0]}.help"
+
+
+def GetHelpWidth() -> int:
+    # Same width argparse wraps to (shutil.get_terminal_size() - 2), without
+    # importing shutil.
+    try:
+        columns = int(os.environ["COLUMNS"])
+    except (KeyError, ValueError):
+        columns = 0
+    if columns <= 0:
+        try:
+            columns = os.get_terminal_size(sys.__stdout__.fileno()).columns
+        except (AttributeError, ValueError, OSError):
+            columns = 80
+    return columns - 2
+
+
+def DumpHelpCache(
+    commands: Any, group: str, discription: str, cache_key: Any, command_list_json: str
+) -> None:
+    # Help texts rendered once at generation time. The full text and usage
+    # depend on the terminal width and the json path shown in the
+    # description, so they are only used while both still match. Each text
+    # is a utf-8 section, so a lookup only decodes the one it prints.
+    import tables
+
+    help_epilog_str = GetHelpString(commands)
     argparser = AplyArgParser(group, discription, help_epilog_str, command_list_json)
-    params = argparser.parse_args()
+    sections = [
+        argparser.format_help().encode(),
+        argparser.format_usage().encode(),
+        help_epilog_str.encode(),
+    ]
+    texts = {"help": 0, "usage": 1, "epilog": 2}
+    command_texts = {}
+    for cmd in commands:
+        command_texts[cmd] = len(sections)
+        sections.append(GetHelpString({cmd: commands[cmd]}).encode())
+    help_cache = command_list_json, GetHelpWidth(), texts, command_texts
+    header = HELP_CACHE_VERSION, cache_key, help_cache
+    tables.DumpSectionFile(GetHelpCachePath(command_list_json), header, sections)
 
-    if not params.command:
-        help_message = argparser.format_help()
-        print(help_message)
-        sys.exit(0)
+
+def ReadHelpCache(command_list_json: str) -> Any:
+    # Returns (path, width, texts, command_texts, sections).
+    import tables
+
+    try:
+        header, sections = tables.LoadSectionFile(GetHelpCachePath(command_list_json))
+        version, key, help_cache = header
+        cache_key = GetCommandCacheKey(command_list_json)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != HELP_CACHE_VERSION or key != cache_key:
+        return None
+    return help_cache + (sections,)
+
+
+def ReadHelpText(command_list_json: str, name: str, needs_layout: bool) -> Any:
+    help_cache = ReadHelpCache(command_list_json)
+    if help_cache is None:
+        return None
+    path, width, texts, command_texts, sections = help_cache
+    if needs_layout and (path != command_list_json or width != GetHelpWidth()):
+        return None
+    return str(sections[texts[name]], "utf-8")
+
+
+def ReadCommandHelpText(command_list_json: str, cmd: str) -> Any:
+    help_cache = ReadHelpCache(command_list_json)
+    if help_cache is None or cmd not in help_cache[3]:
+        return None
+    return str(help_cache[4][help_cache[3][cmd]], "utf-8")
+
+
+def LoadCommandSetting(command_list_json: str) -> Any:
+    with timing.Phase("load_cache"):
+        cache = ReadCommandCache(command_list_json)
+    if cache is None:
+        with timing.Phase("load_json"):
+            return ReadCommandSetting(command_list_json)
+    return cache
+
+
+class DispatchParams:
+    def __init__(self) -> None:
+        self.help = False
+        self.command = None
+        self.argument = []
+        self.show = False
+        self.copy = False
+        self.no_cache = False
+        self.refresh_cache = False
+        self.batch = None
+        self.parallel = None
+
+
+def ParseArgsFast(argv: Any) -> Any:
+    # Mirrors AplyArgParser for plain invocations; anything else (unknown or
+    # abbreviated options, "--") returns None so argparse decides.
+    params = DispatchParams()
+    positionals = []
+    is_after_option = False
+    for token in argv:
+        if token in ("-h", "--help"):
+            # argparse prints help as soon as it sees the flag.
+            params.help = True
+            return params
+        elif token in ("-s", "--show"):
+            params.show = True
+            is_after_option = True
+        elif token in ("-c", "--copy"):
+            params.copy = True
+            is_after_option = True
+        elif token.startswith("-") and token != "-":
+            return None
+        elif is_after_option and positionals:
+            # argparse fills both positionals from the first run of them,
+            # so it rejects `cmd -s arg` with a usage error.
+            return None
+        else:
+            positionals.append(token)
+    if positionals:
+        params.command = positionals[0]
+        params.argument = positionals[1:]
+    return params
+
+
+def GetArgParser(
+    commands: Any, group: str, discription: str, command_list_json: str
+) -> Any:
+    with timing.Phase("help_string"):
+        help_epilog_str = ReadHelpText(command_list_json, "epilog", False)
+        if help_epilog_str is None:
+            help_epilog_str = GetHelpString(commands)
+    with timing.Phase("argparse"):
+        return AplyArgParser(group, discription, help_epilog_str, command_list_json)
+
+
+def GetHelpText(
+    commands: Any, group: str, discription: str, command_list_json: str
+) -> str:
+    help_message = ReadHelpText(command_list_json, "help", True)
+    if help_message is not None:
+        return help_message
+    return GetArgParser(commands, group, discription, command_list_json).format_help()
+
+
+def GetUsageText(
+    commands: Any, group: str, discription: str, command_list_json: str
+) -> str:
+    usage_message = ReadHelpText(command_list_json, "usage", True)
+    if usage_message is not None:
+        return usage_message
+    return GetArgParser(commands, group, discription, command_list_json).format_usage()
+
+
+def GetCommandHelpText(commands: Any, cmd: str, command_list_json: str) -> str:
+    help_message = ReadCommandHelpText(command_list_json, cmd)
+    if help_message is not None:
+        return help_message
+    return GetHelpString({cmd: commands[cmd]})
+
+
+def CopyToClipboard(cmd_line: str) -> None:
+    import clipboard
+
+    clipboard.copy(cmd_line)
+
+
+SHELL_METACHARACTERS = frozenset("|&;<>()$`\\\"'*?[]{}~!\n")
+SHELL_BUILTINS = frozenset(
+    [".", ":", "alias", "break", "case", "cd", "command", "continue", "do"]
+    + ["done", "elif", "else", "esac", "eval", "exec", "exit", "export", "fi"]
+    + ["for", "function", "getopts", "hash", "if", "local", "read", "readonly"]
+    + ["return", "set", "shift", "source", "then", "time", "times", "trap"]
+    + ["type", "ulimit", "umask", "unalias", "unset", "until", "wait", "while"]
+)
+
+
+def SplitCommandLine(cmd_line: str) -> Any:
+    # Returns argv when the line means the same to execvp as to sh -c,
+    # otherwise None.
+    if not SHELL_METACHARACTERS.isdisjoint(cmd_line):
+        return None
+    cmd_argv = cmd_line.split()
+    if not cmd_argv or cmd_argv[0] in SHELL_BUILTINS or "=" in cmd_argv[0]:
+        return None
+    for token in cmd_argv:
+        if token.startswith("#"):
+            return None
+    return cmd_argv
+
+
+def GetCacheSetting(params: Any, commands: Any) -> Any:
+    # Cache setting of the entry a "run" resolved to: the argument's own, or
+    # else the command's, which covers its line and all its arguments.
+    cmd_v = commands[params.command]
+    if params.argument and params.argument[0] in cmd_v[2]:
+        arg_options = cmd_v[2][params.argument[0]][2]
+        if arg_options and "cache" in arg_options:
+            return arg_options["cache"]
+    if cmd_v[3] and "cache" in cmd_v[3]:
+        return cmd_v[3]["cache"]
+    return None
+
+
+def RunCommandLineCached(
+    cmd_line: str, cache_setting: Any, command_list_json: str, is_refresh: bool
+) -> int:
+    with timing.Phase("exec_cached"):
+        import run_cache
+
+        ttl, key_env = cache_setting
+        cache_dir = run_cache.GetRunCacheDir(command_list_json)
+        cache_path = run_cache.GetRunCachePath(cache_dir, cmd_line, key_env)
+        cmd_argv = SplitCommandLine(cmd_line)
+        sh_argv = ["/bin/sh", "-c", cmd_line]
+        try:
+            return run_cache.RunCached(
+                cmd_argv if cmd_argv is not None else sh_argv,
+                cache_path,
+                ttl,
+                is_refresh,
+            )
+        except OSError:
+            return run_cache.RunCached(sh_argv, cache_path, ttl, is_refresh)
+
+
+def RunCommandLine(cmd_line: str) -> None:
+    with timing.Phase("exec"):
+        cmd_argv = SplitCommandLine(cmd_line)
+    stats.Flush()
+    timing.Finish()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    if cmd_argv is not None:
+        try:
+            os.execvp(cmd_argv[0], cmd_argv)
+        except OSError:
+            pass
+    os.execv("/bin/sh", ["sh", "-c", cmd_line])
+
+
+def GetCommandListJson(exec_file: str) -> str:
+    # Absolute, so "Load from" and the help cache match however the group
+    # was invoked.
+    json_parent = os.path.dirname(os.path.abspath(exec_file))
+    json_stem = os.path.splitext(os.path.basename(exec_file))[0]
+    return f"{json_parent}/json/{json_stem}.json"
+
+
+def GetRunStatus(params: Any, cache_setting: Any = None) -> Any:
+    # Logged exit status of a "run" that does not replace the process with
+    # the command: it is only shown, or answered by the output cache.
+    if params.show or params.copy:
+        return "shown"
+    elif cache_setting is not None and not params.no_cache:
+        return "cached"
+    return None
+
+
+def GetStatsEntry(params: Any, commands: Any, action: str) -> Any:
+    # (command, argument, outcome) logged for a resolved invocation.
+    sub_cmd = params.argument[0] if params.argument else ""
+    if action == "help" or not params.command:
+        return params.command or "", sub_cmd, "help"
+    elif params.command not in commands:
+        return params.command, "", "suggested"
+    args = commands[params.command][2]
+    if action in ("run", "steps"):
+        return params.command, sub_cmd if sub_cmd in args else "", "resolved"
+    elif sub_cmd and args and sub_cmd not in args:
+        return params.command, sub_cmd, "suggested"
+    return params.command, sub_cmd, "error"
+
+
+def ResolveCommand(
+    params: Any, commands: Any, group: str, discription: str, command_list_json: str
+) -> Any:
+    if params.help:
+        # print_help() writes the text as is, ExecuteCommand adds a newline.
+        help_message = GetHelpText(commands, group, discription, command_list_json)
+        return "help", help_message.rstrip("\n")
+    elif not params.command:
+        return "help", GetHelpText(commands, group, discription, command_list_json)
     elif params.command == "help":
         if params.argument and params.argument[0] in commands.keys():
-            commands_tmp = {params.argument[0]: commands[params.argument[0]]}
-            help_message = GetHelpString(commands_tmp)
+            help_message = GetCommandHelpText(
+                commands, params.argument[0], command_list_json
+            )
         else:
-            help_message = argparser.format_help()
-        print(help_message)
-        sys.exit(0)
+            help_message = GetHelpText(
+                commands, group, discription, command_list_json
+            )
+        return "help", help_message
     elif params.command not in commands.keys():
         error_message = f"{group}: '{params.command}' is not a {group} command. See '{group} --help'.\n\n"
         error_message += "The most similar commands are\n"
-        candidates = GetSimilarOne(params.command, commands.keys())
+        candidates = GetSimilarCandidates(
+            params.command, tuple(commands), command_list_json, ""
+        )
         for cmd in candidates:
             error_message += f"\t{cmd}\n"
-        sys.exit(error_message)
+        return "error", error_message
+
+    if GetCommandSteps(commands[params.command]) and not params.argument:
+        return "steps", params.command
 
     cmd_line = commands[params.command][1]
     is_only_cmd = cmd_line and (
-        not params.argument or not params.argument[0] in commands[params.command][2]
+        not params.argument or params.argument[0] not in commands[params.command][2]
     )
 
     if is_only_cmd:
         cmd_line_with_arg = cmd_line
         for arg in params.argument:
             cmd_line_with_arg += " " + arg
-        if params.show:
-            print(cmd_line_with_arg)
-        elif params.copy:
-            print(cmd_line_with_arg)
-            clipboard.copy(cmd_line_with_arg)
-        else:
-            sh_cmd = [cmd_line_with_arg]
-            subprocess.run(sh_cmd, shell=True)
-        return 0
+        return "run", cmd_line_with_arg
 
     args = commands[params.command][2]
 
     if not params.argument:
-        error_message = argparser.format_usage()
+        error_message = GetUsageText(commands, group, discription, command_list_json)
         error_message += f"\n{group}: Not found argument for {params.command}. See '{group} --help'.\n\n"
         error_message += "The available arguments are\n"
         for arg in args.keys():
             error_message += f"\t{arg}\n"
-        sys.exit(error_message)
+        return "error", error_message
 
     sub_cmd = params.argument[0]
-    if not args.keys():
-        error_message = argparser.format_usage()
+    if not args:
+        error_message = GetUsageText(commands, group, discription, command_list_json)
         error_message += f"\n{group}: Any argument is not acceptable for {params.command}. See '{group} --help'.\n\n"
-        sys.exit(error_message)
-    elif sub_cmd not in args.keys():
+        return "error", error_message
+    elif sub_cmd not in args:
         error_message = f"{group}: '{sub_cmd}' is not a '{group} {params.command}' argument. See '{group} --help'.\n\n"
         error_message += "The most similar arguments are\n"
-        candidates = GetSimilarOne(sub_cmd, args.keys())
+        candidates = GetSimilarCandidates(
+            sub_cmd, args.keys(), command_list_json, params.command
+        )
         for arg in candidates:
             error_message += f"\t{arg}\n"
-        sys.exit(error_message)
+        return "error", error_message
 
     cmd_line = args[sub_cmd][1]
     cmd_line_with_arg = cmd_line
     for arg in params.argument[1:]:
         cmd_line_with_arg += " " + arg
+    return "run", cmd_line_with_arg
+
+
+def ResolveCommandIndexed(params: Any, command_list_json: str) -> Any:
+    # Resolves plain alias invocations through the alias index. Returns the
+    # command line, or None when the full setting is needed (help, errors,
+    # suggestions) or the index does not cover the current json.
+    if params.help or not params.command or params.command == "help":
+        return None
+    import alias_index
+
+    group = os.path.splitext(os.path.basename(command_list_json))[0]
+    index_path = alias_index.GetAliasIndexPath(os.path.dirname(command_list_json))
+    try:
+        cache_key = GetCommandCacheKey(command_list_json)
+        index = alias_index.AliasIndex(index_path)
+    except (OSError, ValueError):
+        return None
+    with index:
+        if not index.IsGroupCurrent(group, cache_key):
+            return None
+        cmd_record = index.Lookup(alias_index.GetRecordKey(group, params.command))
+        if cmd_record is None:
+            return None
+        cmd_line = cmd_record[0].decode()
+        arg_record = None
+        if params.argument and cmd_record[1] & alias_index.FLAG_HAS_ARGS:
+            arg_record = index.Lookup(
+                alias_index.GetRecordKey(group, params.command, params.argument[0])
+            )
+    # Entries with a cache setting are left to the full path.
+    resolved_record = arg_record if arg_record is not None else cmd_record
+    if resolved_record[1] & alias_index.FLAG_CACHED:
+        return None
+
+    if cmd_line and arg_record is None:
+        stats.Record(params.command, "", "resolved", GetRunStatus(params))
+        cmd_line_with_arg = cmd_line
+        for arg in params.argument:
+            cmd_line_with_arg += " " + arg
+        return cmd_line_with_arg
+    if arg_record is None:
+        return None
+
+    status = GetRunStatus(params)
+    stats.Record(params.command, params.argument[0], "resolved", status)
+    cmd_line_with_arg = arg_record[0].decode()
+    for arg in params.argument[1:]:
+        cmd_line_with_arg += " " + arg
+    return cmd_line_with_arg
+
+
+def GetCompletion(words: Any, command_list_json: str) -> str:
+    # `<group> __complete <words...>`: words are the positional arguments
+    # typed so far, the last one being the word under the cursor.
+    import complete
+
+    if len(words) <= 1:
+        table_name = ""
+    elif len(words) == 2:
+        table_name = words[0]
+    else:
+        return complete.FormatCompletion(None)
+
+    try:
+        cache_key = GetCommandCacheKey(command_list_json)
+    except OSError:
+        return complete.FormatCompletion(None)
+    tables = complete.ReadCompleteIndex(command_list_json, cache_key)
+    if tables is not None:
+        if table_name not in tables:
+            return complete.FormatCompletion(None)
+        return complete.FormatCompletion(marshal.loads(tables[table_name]))
+    commands, _, _ = LoadCommandSetting(command_list_json)
+    return complete.FormatCompletion(
+        complete.BuildCompleteTable(commands, table_name)
+    )
+
+
+class BatchJob:
+    def __init__(self, number: int, invocation: str) -> None:
+        self.number = number
+        self.invocation = invocation
+        self.entry = "", "", "error"
+        self.is_shown = False
+        self.cmd_line = None
+        self.output = ""
+        self.returncode = 0
+        self.elapsed = 0.0
+
+
+def ReadBatchJobs(batch_file: str) -> Any:
+    if batch_file == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(batch_file, "r", encoding="utf-8") as file:
+            lines = file.read().splitlines()
+    jobs = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            jobs.append(BatchJob(len(jobs) + 1, line))
+    return jobs
+
+
+def ResolveBatchJob(
+    job: BatchJob, commands: Any, group: str, discription: str, command_list_json: str
+) -> None:
+    import shlex
+
+    try:
+        params = ParseArgsFast(shlex.split(job.invocation))
+    except ValueError as e:
+        job.output, job.returncode = f"{group}: {e}\n", 1
+        return
+    if params is None or params.copy:
+        job.output = f"{group}: a batch line takes only 'command argument... [-s]'.\n"
+        job.returncode = 1
+        return
+
+    action, text = ResolveCommand(
+        params, commands, group, discription, command_list_json
+    )
+    job.entry = GetStatsEntry(params, commands, action)
+    if action == "run" and not params.show:
+        job.cmd_line = text
+        return
+    elif action == "steps":
+        action, text = "error", f"{group}: '{text}' has steps, run it on its own."
+    job.is_shown = action == "run"
+    job.output = text if text.endswith("\n") else f"{text}\n"
+    job.returncode = 1 if action == "error" else 0
+
+
+def RunBatchJob(job: BatchJob) -> BatchJob:
+    # Same argv as RunCommandLine would exec; output is buffered per job so
+    # parallel jobs do not interleave.
+    import subprocess
+    import time
+
+    start = time.perf_counter()
+    cmd_argv = SplitCommandLine(job.cmd_line)
+    sh_argv = ["/bin/sh", "-c", job.cmd_line]
+    try:
+        proc = subprocess.run(
+            cmd_argv if cmd_argv is not None else sh_argv,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+    except OSError:
+        proc = subprocess.run(
+            sh_argv,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+    job.output = proc.stdout.decode(errors="replace")
+    job.returncode = proc.returncode
+    job.elapsed = time.perf_counter() - start
+    return job
+
+
+def ShowBatchJob(job: BatchJob) -> None:
+    status = f"exit {job.returncode}, {job.elapsed:.3f} s"
+    print(f"==> [{job.number}] {job.invocation} ({status})", flush=True)
+    sys.stdout.write(job.output)
+    sys.stdout.flush()
+
+
+def ShowBatchSummary(jobs: Any, elapsed: float, parallel: int) -> None:
+    lines = ["summary:", f"{'#':>5} {'exit':>5} {'time (s)':>9}  invocation"]
+    for job in jobs:
+        exit_str = "skip" if job.returncode is None else job.returncode
+        lines.append(
+            f"{job.number:5} {exit_str:>5} {job.elapsed:9.3f}  {job.invocation}"
+        )
+    num_failed = sum(1 for job in jobs if job.returncode not in (0, None))
+    num_skipped = sum(1 for job in jobs if job.returncode is None)
+    total = f"{len(jobs)} jobs, {num_failed} failed"
+    if num_skipped:
+        total += f", {num_skipped} skipped"
+    lines.append(f"{total}, {elapsed:.3f} s with --parallel {parallel}")
+    print("\n".join(lines), file=sys.stderr, flush=True)
+
+
+def RecordBatchJobs(jobs: Any) -> None:
+    for job in jobs:
+        status = "shown" if job.is_shown else job.returncode
+        stats.Record(*job.entry, status, job.elapsed)
+
+
+def RunBatch(
+    params: Any, commands: Any, group: str, discription: str, command_list_json: str
+) -> int:
+    # Resolves every line against the one loaded command table, then runs
+    # them on a bounded thread pool; each job waits on its own subprocess.
+    import time
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    try:
+        jobs = ReadBatchJobs(params.batch)
+    except OSError as e:
+        sys.exit(f"{group}: cannot read batch file: {e}")
+    for job in jobs:
+        ResolveBatchJob(job, commands, group, discription, command_list_json)
+
+    parallel = max(1, params.parallel or 1)
+    start = time.perf_counter()
+    for job in jobs:
+        if job.cmd_line is None:
+            ShowBatchJob(job)
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = [
+            executor.submit(RunBatchJob, job)
+            for job in jobs
+            if job.cmd_line is not None
+        ]
+        for future in as_completed(futures):
+            ShowBatchJob(future.result())
+    ShowBatchSummary(jobs, time.perf_counter() - start, parallel)
+    RecordBatchJobs(jobs)
+    return 0 if all(job.returncode == 0 for job in jobs) else 1
+
+
+def RunSteps(
+    params: Any,
+    commands: Any,
+    group: str,
+    discription: str,
+    command_list_json: str,
+    cmd: str,
+) -> int:
+    # Starts every step whose needs have succeeded, up to --parallel at once.
+    # After a failure no new step starts unless the command sets keep_going;
+    # steps left behind are reported as skipped.
+    import time
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    errors = GetStepsErrors(commands, cmd)
+    if errors:
+        sys.exit("\n".join(f"{group}: {error}" for error in errors))
+    steps = GetCommandSteps(commands[cmd])
+    keep_going = commands[cmd][3].get("keep_going", False)
+    jobs = {}
+    for step, _ in steps:
+        jobs[step] = BatchJob(len(jobs) + 1, step)
+        jobs[step].returncode = None
+        ResolveBatchJob(jobs[step], commands, group, discription, command_list_json)
+
+    if params.show or params.copy:
+        # Same as a single command: -s and -c only show the lines.
+        lines = []
+        for step, needs in steps:
+            job = jobs[step]
+            after_str = f" (after {', '.join(needs)})" if needs else ""
+            line = job.cmd_line if job.cmd_line is not None else job.output.strip()
+            lines.append(f"[{job.number}] {line}{after_str}")
+        text = "\n".join(lines)
+        print(text)
+        if params.copy:
+            CopyToClipboard(text)
+        return 0
+
+    parallel = max(1, params.parallel or len(jobs))
+    pending = dict(steps)
+    running = {}
+    succeeded = set()
+    failed = set()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        while pending or running:
+            ready = []
+            if keep_going or not failed:
+                for step, needs in pending.items():
+                    if all(need in succeeded for need in needs):
+                        ready.append(step)
+            for step in ready:
+                del pending[step]
+                job = jobs[step]
+                if job.cmd_line is None:
+                    # Resolved to an error or a shown line; nothing to run.
+                    ShowBatchJob(job)
+                    (succeeded if job.returncode == 0 else failed).add(step)
+                else:
+                    running[executor.submit(RunBatchJob, job)] = step
+            if not running:
+                if ready:
+                    continue
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                job = future.result()
+                ShowBatchJob(job)
+                step = running.pop(future)
+                (succeeded if job.returncode == 0 else failed).add(step)
+
+    ShowBatchSummary(list(jobs.values()), time.perf_counter() - start, parallel)
+    RecordBatchJobs(jobs.values())
+    return 0 if len(succeeded) == len(jobs) else 1
+
+
+def ExecuteCommand(
+    params: Any,
+    action: str,
+    text: str,
+    cache_setting: Any = None,
+    command_list_json: str = "",
+) -> int:
+    if action == "help":
+        print(text)
+        sys.exit(0)
+    elif action == "error":
+        sys.exit(text)
 
     if params.show:
-        print(cmd_line_with_arg)
+        print(text)
     elif params.copy:
-        print(cmd_line_with_arg)
-        clipboard.copy(cmd_line_with_arg)
+        print(text)
+        CopyToClipboard(text)
+    elif cache_setting is not None and not params.no_cache:
+        sys.exit(
+            RunCommandLineCached(
+                text, cache_setting, command_list_json, params.refresh_cache
+            )
+        )
     else:
-        sh_cmd = [cmd_line_with_arg]
-        subprocess.run(sh_cmd, shell=True)
-
+        RunCommandLine(text)
     return 0
 
 
+def main(exec_file: str = __file__) -> int:
+    timing.Start(os.environ.get("COMMAND_ZOO_TRACE"))
+    # home_dir = os.path.expanduser("~")
+    command_list_json = GetCommandListJson(exec_file)
+    stats.Start(os.environ.get("COMMAND_ZOO_STATS"), command_list_json)
+    if not os.path.exists(command_list_json):
+        error_message = f"conf json {command_list_json} does not exists"
+        sys.exit(error_message)
+
+    if sys.argv[1:2] == ["__complete"]:
+        with timing.Phase("complete"):
+            completion = GetCompletion(sys.argv[2:], command_list_json)
+        sys.stdout.write(completion)
+        return 0
+
+    with timing.Phase("parse_args"):
+        params = ParseArgsFast(sys.argv[1:])
+    if params is not None:
+        with timing.Phase("resolve_indexed"):
+            cmd_line = ResolveCommandIndexed(params, command_list_json)
+        if cmd_line is not None:
+            return ExecuteCommand(params, "run", cmd_line)
+
+    commands, group, discription = LoadCommandSetting(command_list_json)
+    if params is None:
+        with timing.Phase("parse_args"):
+            params = GetArgParser(
+                commands, group, discription, command_list_json
+            ).parse_args(namespace=DispatchParams())
+
+    if params.batch is not None:
+        with timing.Phase("batch"):
+            returncode = RunBatch(
+                params, commands, group, discription, command_list_json
+            )
+        sys.exit(returncode)
+
+    with timing.Phase("resolve"):
+        action, text = ResolveCommand(
+            params, commands, group, discription, command_list_json
+        )
+    entry = GetStatsEntry(params, commands, action)
+    if action == "steps":
+        with timing.Phase("steps"):
+            returncode = RunSteps(
+                params, commands, group, discription, command_list_json, text
+            )
+        stats.Record(*entry, GetRunStatus(params) or returncode)
+        sys.exit(returncode)
+    cache_setting = None
+    if action == "run":
+        cache_setting = GetCacheSetting(params, commands)
+        stats.Record(*entry, GetRunStatus(params, cache_setting))
+    else:
+        stats.Record(*entry, {"help": 0, "error": 1}.get(action))
+    return ExecuteCommand(params, action, text, cache_setting, command_list_json)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3.9
+
+# Thin entry point linked as user/<group>. Asks a running commands_server.py
+# to resolve the invocation and falls back to in-process dispatch otherwise.
+# Plain aliases are still looked up in the alias index first, which is faster
+# than a round trip. Requests and responses are marshalled, so neither json
+# (and re) nor the socket module (enum, selectors) is imported.
+
+from __future__ import annotations
+
+import marshal
+import os
+import sys
+
+import commands as group_commands
+import stats
+import timing
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any
+
+SOCKET_NAME = ".commands.sock"
+
+
+def RequestServer(socket_path: str, request: Any) -> Any:
+    # The request ends where the client shuts down writing, the response
+    # where the server closes the connection.
+    import _socket
+
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        sock.settimeout(5.0)
+        sock.connect(socket_path)
+        sock.sendall(marshal.dumps(request))
+        sock.shutdown(_socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = sock.recv(1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        sock.close()
+    return marshal.loads(b"".join(chunks))
+
+
+def main() -> int:
+    timing.Start(os.environ.get("COMMAND_ZOO_TRACE"))
+    exec_file = __file__
+    command_list_json = group_commands.GetCommandListJson(exec_file)
+    stats.Start(os.environ.get("COMMAND_ZOO_STATS"), command_list_json)
+    socket_path = f"{os.path.dirname(exec_file)}/{SOCKET_NAME}"
+    if sys.argv[1:2] == ["__complete"]:
+        return group_commands.main(exec_file)
+    params = group_commands.ParseArgsFast(sys.argv[1:])
+    if params is None or not os.path.exists(socket_path):
+        return group_commands.main(exec_file)
+    with timing.Phase("resolve_indexed"):
+        cmd_line = group_commands.ResolveCommandIndexed(params, command_list_json)
+    if cmd_line is not None:
+        return group_commands.ExecuteCommand(params, "run", cmd_line)
+
+    group = os.path.splitext(os.path.basename(exec_file))[0]
+    request = {
+        "op": "resolve",
+        "group": group,
+        "argv": sys.argv[1:],
+        # Help is laid out for this terminal, not the server's.
+        "columns": group_commands.GetHelpWidth() + 2,
+    }
+    try:
+        with timing.Phase("server_request"):
+            response = RequestServer(socket_path, request)
+    except (OSError, EOFError, ValueError, TypeError):
+        return group_commands.main(exec_file)
+    if not isinstance(response, dict):
+        return group_commands.main(exec_file)
+
+    action = response.get("action")
+    if action not in ("help", "error", "run"):
+        return group_commands.main(exec_file)
+    if response.get("entry") and action == "run":
+        status = group_commands.GetRunStatus(params, response.get("cache"))
+        stats.Record(*response["entry"], status)
+    elif response.get("entry"):
+        stats.Record(*response["entry"], {"help": 0, "error": 1}.get(action))
+    return group_commands.ExecuteCommand(
+        params,
+        action,
+        response["text"],
+        response.get("cache"),
+        command_list_json,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3.9
+
+from __future__ import annotations
+
+import argparse
+import marshal
+import os
+import pathlib
+import signal
+import socket
+import socketserver
+import sys
+from pathlib import Path
+
+import commands as group_commands
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any
+
+SOCKET_NAME = ".commands.sock"
+# Seconds a client may take to send its request before it is dropped; the
+# server handles one request at a time.
+REQUEST_TIMEOUT = 1.0
+
+
+def ParseArgs() -> Any:
+    user_dir = f"{pathlib.Path(os.path.abspath(__file__)).parent.parent}/user"
+    argparser = argparse.ArgumentParser(
+        prog="commands_server",
+        description="resident resolver for command-zoo alias groups",
+        add_help=True,
+        epilog="",
+    )
+    argparser.add_argument(
+        "-u",
+        "--user_dir",
+        type=str,
+        default=user_dir,
+        required=False,
+        help="command group directory to serve",
+    )
+    argparser.add_argument(
+        "--socket",
+        type=str,
+        required=False,
+        help=f"unix socket path (default: <user_dir>/{SOCKET_NAME})",
+    )
+    argparser.add_argument(
+        "--verbose",
+        action="store_true",
+        required=False,
+        help="print verbose",
+    )
+    return argparser.parse_args()
+
+
+class CommandGroupTable:
+    def __init__(self, user_dir: str) -> None:
+        self.user_dir = user_dir
+        self.groups = {}
+
+    def LoadAll(self) -> None:
+        for json_path in sorted(Path(f"{self.user_dir}/json").glob("*.json")):
+            self.Get(json_path.stem)
+
+    def Get(self, group: str) -> Any:
+        if not group or "/" in group or group.startswith("."):
+            return None
+        command_list_json = f"{self.user_dir}/json/{group}.json"
+        try:
+            key = group_commands.GetCommandCacheKey(command_list_json)
+        except OSError:
+            self.groups.pop(group, None)
+            return None
+        if group in self.groups and self.groups[group][0] == key:
+            return self.groups[group][1]
+        setting = group_commands.LoadCommandSetting(command_list_json)
+        self.groups[group] = key, setting
+        return setting
+
+
+def HandleRequest(table: CommandGroupTable, request: Any) -> Any:
+    # COLUMNS holds the client's terminal width for the help and usage texts
+    # of this request only.
+    columns_old = os.environ.get("COLUMNS")
+    if request.get("columns"):
+        os.environ["COLUMNS"] = str(request["columns"])
+    try:
+        return ResolveRequest(table, request)
+    finally:
+        if columns_old is None:
+            os.environ.pop("COLUMNS", None)
+        else:
+            os.environ["COLUMNS"] = columns_old
+
+
+def ResolveRequest(table: CommandGroupTable, request: Any) -> Any:
+    group = request.get("group", "")
+    command_list_json = f"{table.user_dir}/json/{group}.json"
+    try:
+        setting = table.Get(group)
+    except SystemExit as e:
+        return {"action": "error", "text": str(e.code)}
+    if setting is None:
+        return {"action": "fallback"}
+    commands, group, discription = setting
+
+    # Help and suggestions for unknown commands and arguments are part of
+    # resolving; -h and the other options argparse handles fall back.
+    op = request.get("op")
+    if op != "resolve":
+        return {"action": "error", "text": f"unknown request: {op}"}
+    params = group_commands.ParseArgsFast(request.get("argv", []))
+    if params is None:
+        return {"action": "fallback"}
+    action, text = group_commands.ResolveCommand(
+        params, commands, group, discription, command_list_json
+    )
+    response = {"action": action, "text": text}
+    response["entry"] = group_commands.GetStatsEntry(params, commands, action)
+    if action == "run":
+        response["cache"] = group_commands.GetCacheSetting(params, commands)
+    return response
+
+
+def IsSocketServed(socket_path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def HandleTerminate(signum: int, frame: Any) -> None:
+    sys.exit(0)
+
+
+def Serve(user_dir: str, socket_path: str, verbose: bool) -> None:
+    table = CommandGroupTable(user_dir)
+    table.LoadAll()
+    if verbose:
+        print(f"[INFO] Loaded {len(table.groups)} command groups.")
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        timeout = REQUEST_TIMEOUT
+
+        def handle(self) -> None:
+            # Same marshal framing as commands_client.RequestServer.
+            try:
+                request = marshal.loads(self.rfile.read())
+            except (OSError, EOFError, ValueError, TypeError):
+                return
+            if not isinstance(request, dict):
+                return
+            response = HandleRequest(table, request)
+            self.wfile.write(marshal.dumps(response))
+
+    if os.path.exists(socket_path):
+        if IsSocketServed(socket_path):
+            error_message = f"[ERROR] \033[31mAlready served: {socket_path}\033[0m"
+            sys.exit(error_message)
+        # Left behind by a server that did not exit cleanly.
+        os.remove(socket_path)
+    umask_old = os.umask(0o077)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, RequestHandler)
+    finally:
+        os.umask(umask_old)
+    print(f"[INFO] Listening on \033[34m{socket_path}\033[0m")
+    signal.signal(signal.SIGTERM, HandleTerminate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def main() -> int:
+    args = ParseArgs()
+    user_dir = os.path.abspath(args.user_dir)
+    if not os.path.isdir(f"{user_dir}/json"):
+        error_message = f"[ERROR] \033[31mNo command groups in {user_dir}.\033[0m"
+        sys.exit(error_message)
+    socket_path = args.socket if args.socket else f"{user_dir}/{SOCKET_NAME}"
+    Serve(user_dir, socket_path, args.verbose)
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import marshal
+import os
+
+# Imported by `<group> __complete`, which runs on every tab press, so typing
+# stays out of the import path.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any
+
+COMPLETE_INDEX_VERSION = 2
+
+
+def GetCompleteIndexPath(command_list_json: str) -> str:
+    return f"{os.path.splitext(command_list_json)[0]}.complete"
+
+
+def BuildCompleteTable(commands: Any, table_name: str) -> Any:
+    # Table "" completes the command, "help" the command to show help for,
+    # any other name the arguments of that command. Returns (kind,
+    # [(name, description)]) where kind tells the completer whether files
+    # are also offered, or None for an unknown command.
+    if table_name == "":
+        candidates = [("help", "show help")]
+        for cmd, cmd_v in commands.items():
+            if cmd != "help":
+                candidates.append((cmd, cmd_v[0] if cmd_v[0] else f"perform {cmd}"))
+        return "commands", candidates
+    elif table_name == "help":
+        candidates = []
+        for cmd, cmd_v in commands.items():
+            if cmd != "help":
+                candidates.append((cmd, cmd_v[0]))
+        return "arguments", candidates
+    elif table_name not in commands:
+        return None
+
+    cmd_line, args = commands[table_name][1:3]
+    candidates = [(arg, arg_v[0]) for arg, arg_v in args.items()]
+    return "arguments+files" if cmd_line else "arguments", candidates
+
+
+def BuildCompleteIndex(commands: Any) -> Any:
+    # Returns ({table_name: section}, sections) for tables.DumpSectionFile.
+    # Tables are marshalled separately so a tab press only decodes the one
+    # it needs.
+    table_ids = {"": 0}
+    sections = [marshal.dumps(BuildCompleteTable(commands, ""))]
+    for cmd in commands:
+        table_ids[cmd] = len(sections)
+        sections.append(marshal.dumps(BuildCompleteTable(commands, cmd)))
+    return table_ids, sections
+
+
+def DumpCompleteIndex(commands: Any, cache_key: Any, command_list_json: str) -> None:
+    import tables
+
+    table_ids, sections = BuildCompleteIndex(commands)
+    header = COMPLETE_INDEX_VERSION, cache_key, table_ids
+    tables.DumpSectionFile(GetCompleteIndexPath(command_list_json), header, sections)
+
+
+def ReadCompleteIndex(command_list_json: str, cache_key: Any) -> Any:
+    # Returns {table_name: marshalled table} with the tables still in the
+    # mapped file.
+    import tables
+
+    try:
+        header, sections = tables.LoadSectionFile(
+            GetCompleteIndexPath(command_list_json)
+        )
+        version, key, table_ids = header
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != COMPLETE_INDEX_VERSION or key != cache_key:
+        return None
+    return {name: sections[i] for name, i in table_ids.items()}
+
+
+def FormatCompletion(table: Any) -> str:
+    # First line is the kind, then one "name:description" per candidate in
+    # the form zsh's _describe expects.
+    if table is None:
+        return "files\n"
+    kind, candidates = table
+    lines = [kind]
+    for name, desc in candidates:
+        name = name.replace("\\", "\\\\").replace(":", "\\:").replace("\n", " ")
+        desc = desc.replace("\n", " ")
+        lines.append(f"{name}:{desc}" if desc else name)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+import json
+
+import tables
+
+# Only imported when a command group misses its cache, so typing stays out of
+# the import path like in commands.py.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any
+
+# Loader and schema check of command group configs, shared by command-zoo.py
+# (a list of groups) and the generated commands (user/json/<group>.json, one
+# group). A file is read and parsed once, and one walk over the result both
+# checks the schema and builds the normalized setting of each group:
+#
+#   (commands, group, discription)
+#   commands[cmd] = desc, line, {arg: (desc, line, arg_options)}, cmd_options
+#
+# where the arguments of a command are a tables.ArgTable, a packed read-only
+# mapping that the dispatch cache also stores and maps back in place.
+#
+# Problems are collected with their json path instead of stopping at the
+# first. Their line and column are looked up afterwards in the text already
+# read, so a valid file pays nothing for them.
+
+
+class ConfigError:
+    def __init__(self, path: Any, message: str) -> None:
+        self.path = path
+        self.message = message
+        self.line = None
+        self.column = None
+
+    def Format(self, config_path: str) -> str:
+        location = config_path
+        if self.line is not None:
+            location += f":{self.line}:{self.column}"
+        return f"{location}: {FormatJsonPath(self.path)}: {self.message}"
+
+
+def FormatJsonPath(path: Any) -> str:
+    text = "$"
+    for key in path:
+        text += f"[{key}]" if isinstance(key, int) else f".{key}"
+    return text
+
+
+def FormatConfigErrors(errors: Any, config_path: str) -> str:
+    lines = [f"[ERROR] \033[31mInvalid config: {len(errors)} problem(s).\033[0m"]
+    lines += [error.Format(config_path) for error in errors]
+    lines.append(f"Please fix \033[34m{config_path}\033[0m.")
+    return "\n".join(lines)
+
+
+def SkipSpace(text: str, index: int) -> int:
+    while index < len(text) and text[index] in " \t\n\r":
+        index += 1
+    return index
+
+
+def LocateJsonPath(text: str, path: Any) -> int:
+    # Index of the value at path in text, or of the deepest container found
+    # on the way. Siblings are skipped with the C decoder.
+    decoder = json.JSONDecoder()
+    index = SkipSpace(text, 0)
+    for key in path:
+        container = index
+        if isinstance(key, int) and text.startswith("[", index):
+            index = SkipSpace(text, index + 1)
+            for _ in range(key):
+                _, index = decoder.raw_decode(text, index)
+                index = SkipSpace(text, SkipSpace(text, index) + 1)
+        elif isinstance(key, str) and text.startswith("{", index):
+            index = SkipSpace(text, index + 1)
+            while text.startswith('"', index):
+                name, index = json.decoder.scanstring(text, index + 1)
+                index = SkipSpace(text, SkipSpace(text, index) + 1)
+                if name == key:
+                    break
+                _, index = decoder.raw_decode(text, index)
+                index = SkipSpace(text, SkipSpace(text, index) + 1)
+            else:
+                return container
+        else:
+            return container
+    return index
+
+
+def LocateErrors(errors: Any, text: str) -> None:
+    for error in errors:
+        try:
+            index = LocateJsonPath(text, error.path)
+        except (ValueError, IndexError):
+            continue
+        error.line = text.count("\n", 0, index) + 1
+        error.column = index - text.rfind("\n", 0, index)
+
+
+def LocateFileErrors(errors: Any, config_path: str) -> None:
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            LocateErrors(errors, file.read())
+    except (OSError, UnicodeDecodeError):
+        pass
+
+
+def CheckType(value: Any, types: Any, type_name: str, path: Any, errors: Any) -> bool:
+    if isinstance(value, types) and not isinstance(value, bool):
+        return True
+    errors.append(ConfigError(path, f"must be {type_name}."))
+    return False
+
+
+def GetString(elem: Any, key: str, path: Any, errors: Any) -> str:
+    value = elem.get(key, "")
+    if not CheckType(value, str, "a string", path + (key,), errors):
+        return ""
+    return value
+
+
+def NormalizeCacheSetting(cache_json: Any, path: Any, errors: Any) -> Any:
+    # "cache": {"ttl": seconds, "key_env": [env names]} -> (ttl, key_env)
+    if not CheckType(cache_json, dict, "an object", path, errors):
+        return None
+    ttl = cache_json.get("ttl", 60)
+    if isinstance(ttl, bool) or not isinstance(ttl, (int, float)) or ttl < 0:
+        errors.append(ConfigError(path + ("ttl",), "must be a non-negative number."))
+        return None
+    key_env = cache_json.get("key_env", [])
+    if not CheckType(key_env, list, "a list", path + ("key_env",), errors):
+        return None
+    for i, name in enumerate(key_env):
+        if not CheckType(name, str, "a string", path + ("key_env", i), errors):
+            return None
+    return ttl, tuple(key_env)
+
+
+def NormalizeCommandSteps(steps_json: Any, path: Any, errors: Any) -> Any:
+    # A step is a "command argument..." of the same group, given as a string
+    # or as {"step": ..., "needs": [other steps]}.
+    if not CheckType(steps_json, list, "a list", path, errors):
+        return ()
+    steps = []
+    for i, step_elem in enumerate(steps_json):
+        if isinstance(step_elem, str):
+            steps.append((step_elem, ()))
+            continue
+        elif not isinstance(step_elem, dict) or "step" not in step_elem:
+            errors.append(
+                ConfigError(path + (i,), 'must be a string or an object with "step".')
+            )
+            continue
+        step = step_elem["step"]
+        needs = step_elem.get("needs", [])
+        if not CheckType(step, str, "a string", path + (i, "step"), errors):
+            continue
+        if not CheckType(needs, list, "a list", path + (i, "needs"), errors):
+            continue
+        for j, need in enumerate(needs):
+            CheckType(need, str, "a string", path + (i, "needs", j), errors)
+        steps.append((step, tuple(needs)))
+    return tuple(steps)
+
+
+def NormalizeArgs(args_json: Any, path: Any, errors: Any) -> Any:
+    args = {}
+    if not CheckType(args_json, list, "a list", path, errors):
+        return tables.ArgTable.Build(args)
+    for i, arg_elem in enumerate(args_json):
+        arg_path = path + (i,)
+        if not CheckType(arg_elem, dict, "an object", arg_path, errors):
+            continue
+        if "arg" not in arg_elem:
+            continue
+        key = arg_elem["arg"]
+        if not CheckType(key, str, "a string", arg_path + ("arg",), errors):
+            continue
+        arg_options = None
+        if "cache" in arg_elem:
+            arg_options = {
+                "cache": NormalizeCacheSetting(
+                    arg_elem["cache"], arg_path + ("cache",), errors
+                )
+            }
+        args[key] = (
+            GetString(arg_elem, "desc", arg_path, errors),
+            GetString(arg_elem, "line", arg_path, errors),
+            arg_options,
+        )
+    return tables.ArgTable.Build(args)
+
+
+def NormalizeCommand(command_elem: Any, path: Any, errors: Any) -> Any:
+    # Returns (cmd, cmd_v), or None for an entry without a command.
+    if not CheckType(command_elem, dict, "an object", path, errors):
+        return None
+    args = tables.ArgTable.Build({})
+    if "args" in command_elem:
+        args = NormalizeArgs(command_elem["args"], path + ("args",), errors)
+    if "cmd" not in command_elem:
+        return None
+    cmd = command_elem["cmd"]
+    if not CheckType(cmd, str, "a string", path + ("cmd",), errors):
+        return None
+    desc = GetString(command_elem, "desc", path, errors)
+    line = GetString(command_elem, "line", path, errors)
+
+    cmd_options = {}
+    if "steps" in command_elem:
+        cmd_options["steps"] = NormalizeCommandSteps(
+            command_elem["steps"], path + ("steps",), errors
+        )
+        cmd_options["keep_going"] = bool(command_elem.get("keep_going", False))
+    if "cache" in command_elem:
+        cmd_options["cache"] = NormalizeCacheSetting(
+            command_elem["cache"], path + ("cache",), errors
+        )
+
+    if not args and not line and "steps" not in cmd_options:
+        return None
+    return cmd, (desc, line, args, cmd_options if cmd_options else None)
+
+
+def NormalizeGroupItem(json_load: Any, path: Any, errors: Any) -> Any:
+    # Returns (commands, group, discription), or None when the item is not
+    # usable at all. Its problems are appended to errors; the commands are
+    # still checked after a problem with the group itself.
+    import commands as group_commands
+
+    if not CheckType(json_load, dict, "an object", path, errors):
+        return None
+    is_usable = True
+    group = json_load.get("group")
+    if "group" not in json_load:
+        errors.append(ConfigError(path, "'group' key is required."))
+        is_usable = False
+    elif not CheckType(group, str, "a string", path + ("group",), errors):
+        is_usable = False
+    discription = GetString(json_load, "description", path, errors)
+
+    commands_json = json_load.get("commands")
+    if not commands_json:
+        group_name = f" in {group}" if isinstance(group, str) else ""
+        errors.append(ConfigError(path, f"No commands{group_name}."))
+        return None
+    if not CheckType(commands_json, list, "a list", path + ("commands",), errors):
+        return None
+
+    commands = {}
+    commands["help"] = "show help", "", tables.ArgTable.Build({}), None
+    command_paths = {}
+    for i, command_elem in enumerate(commands_json):
+        command_path = path + ("commands", i)
+        command = NormalizeCommand(command_elem, command_path, errors)
+        if command is not None:
+            commands[command[0]] = command[1]
+            command_paths[command[0]] = command_path
+    for cmd, command_path in command_paths.items():
+        for message in group_commands.GetStepsErrors(commands, cmd):
+            errors.append(ConfigError(command_path + ("steps",), message))
+    if not is_usable:
+        return None
+    return commands, group, discription
+
+
+def GetCacheJson(cache_setting: Any) -> Any:
+    ttl, key_env = cache_setting
+    cache_json = {"ttl": ttl}
+    if key_env:
+        cache_json["key_env"] = list(key_env)
+    return cache_json
+
+
+def GetGroupJson(setting: Any) -> Any:
+    # The json of a group that NormalizeGroupItem turns back into setting,
+    # so the generator can drop the parsed json once a group is normalized.
+    commands, group, discription = setting
+    group_json = {"group": group}
+    if discription:
+        group_json["description"] = discription
+    commands_json = []
+    for cmd, (desc, line, args, cmd_options) in commands.items():
+        if cmd == "help":
+            continue
+        command_elem = {"cmd": cmd}
+        if desc:
+            command_elem["desc"] = desc
+        if line:
+            command_elem["line"] = line
+        if args:
+            command_elem["args"] = []
+            for arg, (arg_desc, arg_line, arg_options) in args.items():
+                arg_elem = {"arg": arg}
+                if arg_desc:
+                    arg_elem["desc"] = arg_desc
+                if arg_line:
+                    arg_elem["line"] = arg_line
+                if arg_options and arg_options.get("cache"):
+                    arg_elem["cache"] = GetCacheJson(arg_options["cache"])
+                command_elem["args"].append(arg_elem)
+        if cmd_options and "steps" in cmd_options:
+            command_elem["steps"] = [
+                {"step": step, "needs": list(needs)} if needs else step
+                for step, needs in cmd_options["steps"]
+            ]
+            if cmd_options["keep_going"]:
+                command_elem["keep_going"] = True
+        if cmd_options and cmd_options.get("cache"):
+            command_elem["cache"] = GetCacheJson(cmd_options["cache"])
+        commands_json.append(command_elem)
+    group_json["commands"] = commands_json
+    return group_json
+
+
+def GetIncludePatterns(json_load: Any, path: Any, errors: Any) -> Any:
+    # {"include": "path or glob"} or {"include": [...]} in place of a group
+    # pulls in other configs; returns None for any other item.
+    if not isinstance(json_load, dict) or "include" not in json_load:
+        return None
+    patterns = json_load["include"]
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    if not CheckType(patterns, list, "a string or a list", path + ("include",), errors):
+        return []
+    for i, pattern in enumerate(patterns):
+        if not CheckType(pattern, str, "a string", path + ("include", i), errors):
+            return []
+    return patterns
+
+
+def LoadConfigText(text: str, is_group_file: bool) -> Any:
+    # Returns (items, includes, errors), items being (json path, setting)
+    # per usable group; the parsed json is not kept (see GetGroupJson). A
+    # group file holds one group, any other config a list of groups and
+    # include items.
+    errors = []
+    try:
+        json_load = json.loads(text)
+    except json.JSONDecodeError as e:
+        error = ConfigError((), f"not json format: {e.msg}.")
+        error.line, error.column = e.lineno, e.colno
+        return [], [], [error]
+
+    items = []
+    includes = []
+    if is_group_file:
+        items.append(((), NormalizeGroupItem(json_load, (), errors)))
+    elif CheckType(json_load, list, "a list of command groups", (), errors):
+        for i, item in enumerate(json_load):
+            patterns = GetIncludePatterns(item, (i,), errors)
+            if patterns is not None:
+                includes += patterns
+            else:
+                items.append(((i,), NormalizeGroupItem(item, (i,), errors)))
+    LocateErrors(errors, text)
+    items = [item for item in items if item[1] is not None]
+    return items, includes, errors
+
+
+def LoadConfigFile(config_path: str, is_group_file: bool = False) -> Any:
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            text = file.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return [], [], [ConfigError((), f"cannot be read: {e}.")]
+    return LoadConfigText(text, is_group_file)
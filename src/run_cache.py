@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import hashlib
+import marshal
+import os
+import sys
+import time
+
+# subprocess is only imported on a miss, so a hit costs little more than
+# reading one file.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any
+
+# Output of commands with a "cache" setting, one file per resolved line,
+# working directory (lines may use relative paths) and key_env values. A hit rewrites nothing but the file's mtime, which is what
+# eviction orders by, so the directory behaves as an LRU bounded in bytes.
+
+RUN_CACHE_NAME = ".run_cache"
+RUN_CACHE_VERSION = 2
+RUN_CACHE_MAX_BYTES = 64 << 20
+
+
+def GetRunCacheDir(command_list_json: str) -> str:
+    user_dir = os.path.dirname(os.path.dirname(os.path.abspath(command_list_json)))
+    return f"{user_dir}/{RUN_CACHE_NAME}"
+
+
+def GetRunCacheMaxBytes() -> int:
+    try:
+        return int(os.environ["COMMAND_ZOO_RUN_CACHE_BYTES"])
+    except (KeyError, ValueError):
+        return RUN_CACHE_MAX_BYTES
+
+
+def GetRunCachePath(cache_dir: str, cmd_line: str, key_env: Any) -> str:
+    digest = hashlib.sha256(cmd_line.encode())
+    digest.update(f"\0{os.getcwd()}".encode())
+    for name in key_env:
+        value = os.environ.get(name)
+        digest.update(f"\0{name}\0{'' if value is None else '=' + value}".encode())
+    return f"{cache_dir}/{digest.hexdigest()}"
+
+
+def ReadRunCache(cache_path: str, ttl: float) -> Any:
+    try:
+        with open(cache_path, "rb") as file:
+            version, created, returncode, output = marshal.load(file)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != RUN_CACHE_VERSION or time.time() - created > ttl:
+        return None
+    try:
+        os.utime(cache_path)
+    except OSError:
+        pass
+    return returncode, output
+
+
+def DumpRunCache(cache_path: str, returncode: int, output: bytes) -> None:
+    os.makedirs(os.path.dirname(cache_path), mode=0o700, exist_ok=True)
+    cache_tmp = f"{cache_path}.{os.getpid()}.tmp"
+    with open(cache_tmp, mode="wb") as file:
+        marshal.dump((RUN_CACHE_VERSION, time.time(), returncode, output), file)
+    os.replace(cache_tmp, cache_path)
+
+
+def EvictRunCache(cache_dir: str, max_bytes: int) -> None:
+    entries = []
+    total = 0
+    try:
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+    except OSError:
+        return
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+
+def RunCached(cmd_argv: Any, cache_path: str, ttl: float, is_refresh: bool) -> int:
+    # Serves stdout and the exit code from the cache when fresh, otherwise
+    # runs the command, passing its stdout through as it comes, and stores
+    # both if it succeeded. stdin and stderr stay attached to the terminal.
+    cached = None if is_refresh else ReadRunCache(cache_path, ttl)
+    sys.stdout.flush()
+    if cached is not None:
+        returncode, output = cached
+        sys.stdout.buffer.write(output)
+        sys.stdout.flush()
+        return returncode
+
+    import subprocess
+
+    chunks = []
+    with subprocess.Popen(cmd_argv, stdout=subprocess.PIPE) as proc:
+        fd = proc.stdout.fileno()
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            sys.stdout.buffer.write(chunk)
+            sys.stdout.flush()
+    if proc.returncode == 0:
+        try:
+            DumpRunCache(cache_path, proc.returncode, b"".join(chunks))
+            EvictRunCache(os.path.dirname(cache_path), GetRunCacheMaxBytes())
+        except OSError:
+            pass
+    return proc.returncode
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import fcntl
+import os
+import time
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any
+
+# Opt-in call log of command groups (COMMAND_ZOO_STATS=1). Records are kept
+# in memory and written with one O_APPEND write at exit or before exec, so
+# logging adds no i/o to resolving. Each group logs to user/.stats/<group>.log;
+# past STATS_MAX_BYTES it becomes <group>.log.1 and a new log starts, so at
+# most two segments are kept. Writers hold an flock on <group>.log.lock, so
+# concurrent calls rotate once and never onto a fresh log. The lock is never
+# waited for: while another process holds it, the records are kept for the
+# next flush, or dropped when the process is about to exec.
+#
+# One tab separated line per call:
+#   start time, group, command, argument, outcome, exit status, duration ms
+# outcome is resolved, help, error or suggested (an unknown command or
+# argument answered with similar ones). The exit status is "-" when the
+# process was replaced by the command, "shown" for -s and -c, and "cached"
+# when the output cache answered; the duration then covers the dispatch only.
+
+STATS_DIR_NAME = ".stats"
+STATS_MAX_BYTES = 1 << 20
+
+_log = None
+
+
+class StatsLog:
+    def __init__(self, command_list_json: str) -> None:
+        user_dir = os.path.dirname(os.path.dirname(os.path.abspath(command_list_json)))
+        self.group = os.path.splitext(os.path.basename(command_list_json))[0]
+        self.log_path = GetStatsLogPath(f"{user_dir}/{STATS_DIR_NAME}", self.group)
+        self.start = time.perf_counter()
+        self.records = []
+
+
+def GetStatsLogPath(stats_dir: str, group: str) -> str:
+    return f"{stats_dir}/{group}.log"
+
+
+def Start(spec: Any, command_list_json: str) -> None:
+    global _log
+    if not spec or spec == "0" or _log is not None:
+        return
+    _log = StatsLog(command_list_json)
+    import atexit
+
+    atexit.register(Flush)
+
+
+def Record(
+    command: str,
+    arg: str,
+    outcome: str,
+    status: Any = None,
+    duration: Any = None,
+) -> None:
+    if _log is None:
+        return
+    if duration is None:
+        duration = time.perf_counter() - _log.start
+    fields = [
+        f"{time.time() - duration:.3f}",
+        _log.group,
+        command,
+        arg,
+        outcome,
+        "-" if status is None else str(status),
+        f"{duration * 1000:.2f}",
+    ]
+    line = "\t".join(field.replace("\t", " ").replace("\n", " ") for field in fields)
+    _log.records.append(line + "\n")
+
+
+def Flush() -> None:
+    if _log is None or not _log.records:
+        return
+    data = "".join(_log.records).encode()
+    try:
+        os.makedirs(os.path.dirname(_log.log_path), mode=0o700, exist_ok=True)
+        lock_fd = os.open(f"{_log.log_path}.lock", os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            _log.records = []
+            try:
+                if os.stat(_log.log_path).st_size + len(data) > STATS_MAX_BYTES:
+                    os.replace(_log.log_path, f"{_log.log_path}.1")
+            except FileNotFoundError:
+                pass
+            fd = os.open(_log.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+        finally:
+            # Closing the descriptor releases the lock.
+            os.close(lock_fd)
+    except OSError:
+        _log.records = []
+
+
+def ReadStatsRecords(stats_dir: str, group: str) -> Any:
+    log_path = GetStatsLogPath(stats_dir, group)
+    records = []
+    for path in [f"{log_path}.1", log_path]:
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as file:
+                lines = file.read().splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            fields = line.split("\t")
+            if len(fields) != 7:
+                continue
+            try:
+                duration_ms = float(fields[6])
+            except ValueError:
+                continue
+            records.append((fields[2], fields[3], fields[4], fields[5], duration_ms))
+    return records
+
+
+def Percentile(values: Any, percent: float) -> float:
+    # Nearest rank on sorted values.
+    rank = -(-percent * len(values) // 100)
+    return values[max(0, int(rank) - 1)]
@@ -0,0 +1,95 @@
+import marshal
+import os
+from array import array
+from typing import Any
+
+SUGGEST_INDEX_VERSION = 2
+SHORTLIST_SIZE = 32
+STOP_POSTING_SIZE = 1024
+
+
+def GetSuggestIndexPath(command_list_json: str) -> str:
+    return f"{os.path.splitext(command_list_json)[0]}.suggest"
+
+
+def GetTrigrams(word: str) -> Any:
+    padded = f"  {word.lower()} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def BuildSuggestTable(names: Any) -> Any:
+    # Posting lists are packed uint32 arrays of positions in names, so the
+    # table does not repeat the names the command cache already has and
+    # loading it does not create one int object per entry.
+    postings = {}
+    for i, name in enumerate(names):
+        for trigram in GetTrigrams(name):
+            postings.setdefault(trigram, array("I")).append(i)
+    return {trigram: ids.tobytes() for trigram, ids in postings.items()}
+
+
+def BuildSuggestIndex(commands: Any) -> Any:
+    # Table "" refers to the command names in config order, every other
+    # table to the arguments of the command with that name. Returns
+    # ({table_name: section}, sections) for tables.DumpSectionFile; tables
+    # are marshalled separately so a lookup only decodes the one it needs.
+    table_ids = {"": 0}
+    sections = [marshal.dumps(BuildSuggestTable(tuple(commands)))]
+    for cmd, cmd_v in commands.items():
+        if cmd_v[2]:
+            table_ids[cmd] = len(sections)
+            sections.append(marshal.dumps(BuildSuggestTable(cmd_v[2].keys())))
+    return table_ids, sections
+
+
+def DumpSuggestIndex(commands: Any, cache_key: Any, command_list_json: str) -> None:
+    import tables
+
+    table_ids, sections = BuildSuggestIndex(commands)
+    header = SUGGEST_INDEX_VERSION, cache_key, table_ids
+    tables.DumpSectionFile(GetSuggestIndexPath(command_list_json), header, sections)
+
+
+def ReadSuggestTable(command_list_json: str, cache_key: Any, table_name: str) -> Any:
+    import tables
+
+    try:
+        header, sections = tables.LoadSectionFile(
+            GetSuggestIndexPath(command_list_json)
+        )
+        version, key, table_ids = header
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != SUGGEST_INDEX_VERSION or key != cache_key:
+        return None
+    if table_name not in table_ids:
+        return None
+    return marshal.loads(sections[table_ids[table_name]])
+
+
+def IsSuggestIndexValid(command_list_json: str, cache_key: Any) -> bool:
+    return ReadSuggestTable(command_list_json, cache_key, "") is not None
+
+
+def GetShortlist(target: str, names: Any, postings: Any) -> Any:
+    # names is the sequence the table was built from, e.g. the keys() of an
+    # argument table.
+    if len(names) <= SHORTLIST_SIZE:
+        return list(names)
+
+    # Rarest trigrams first, so very common ones are only scanned when
+    # nothing more selective matched.
+    posting_lists = sorted(
+        (postings[trigram] for trigram in GetTrigrams(target) if trigram in postings),
+        key=len,
+    )
+    overlaps = {}
+    for ids_bytes in posting_lists:
+        ids = array("I", ids_bytes)
+        if len(ids) > STOP_POSTING_SIZE and overlaps:
+            break
+        for i in ids:
+            overlaps[i] = overlaps.get(i, 0) + 1
+
+    ranked = sorted(overlaps.items(), key=lambda item: (-item[1], item[0]))
+    return [names[i] for i, _ in ranked[:SHORTLIST_SIZE]]
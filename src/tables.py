@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import marshal
+import mmap
+import os
+from array import array
+
+# Loaded whenever a command group reads its cache, so typing stays out of the
+# import path like in commands.py.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any
+
+# Packed tables of the command model and of the indexes built from it.
+# Strings are utf-8 in one buffer with uint32 end offsets and numbers are
+# uint32 arrays, so the arguments of a command are a few buffers instead of a
+# tuple and two strings per argument.
+#
+# A section file holds such buffers one after another (8-byte aligned), then
+# the marshalled (header, [(offset, size)]) and the offset of that. Readers
+# map the file and use the sections in place, so only the pages a lookup
+# touches are read and nothing is copied to the heap.
+
+SECTION_ALIGN = 8
+LINE_PREFIX_MIN = 16
+
+
+class StringTable:
+    __slots__ = ("data", "ends")
+
+    def __init__(self, data: Any, ends: Any) -> None:
+        self.data = data
+        self.ends = ends
+
+    @classmethod
+    def Build(cls, strings: Any) -> StringTable:
+        data = bytearray()
+        ends = array("I")
+        for string in strings:
+            data += string.encode()
+            ends.append(len(data))
+        return cls(bytes(data), ends)
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def __getitem__(self, i: int) -> str:
+        start = self.ends[i - 1] if i > 0 else 0
+        return str(self.data[start : self.ends[i]], "utf-8")
+
+    def __iter__(self) -> Any:
+        data = self.data
+        start = 0
+        for end in self.ends:
+            yield str(data[start:end], "utf-8")
+            start = end
+
+
+def GetUInt32View(buffer: Any) -> Any:
+    return memoryview(buffer).cast("I")
+
+
+class ArgTable:
+    # Read-only {arg: (desc, line, arg_options)} of one command, in the order
+    # of the config. A line whose prefix (up to its last space) other
+    # arguments share is kept as that prefix and its own tail, and equal
+    # strings are stored once. keys() is the positional name table, which
+    # the suggest index refers to by position.
+    __slots__ = ("names", "order", "strings", "descs", "prefixes", "tails", "options")
+
+    def __init__(
+        self,
+        names: StringTable,
+        order: Any,
+        strings: StringTable,
+        descs: Any,
+        prefixes: Any,
+        tails: Any,
+        options: Any,
+    ) -> None:
+        self.names = names
+        # Positions sorted by name, for lookups.
+        self.order = order
+        self.strings = strings
+        self.descs = descs
+        self.prefixes = prefixes
+        self.tails = tails
+        # {position: arg_options} of the arguments that have any.
+        self.options = options
+
+    @classmethod
+    def Build(cls, args: Any) -> ArgTable:
+        prefix_counts = {}
+        for _, line, _ in args.values():
+            prefix = line[: line.rfind(" ") + 1]
+            if len(prefix) >= LINE_PREFIX_MIN:
+                prefix_counts[prefix] = prefix_counts.get(prefix, 0) + 1
+
+        string_ids = {"": 0}
+        descs, prefixes, tails = array("I"), array("I"), array("I")
+        options = {}
+        for i, (desc, line, arg_options) in enumerate(args.values()):
+            prefix = line[: line.rfind(" ") + 1]
+            if prefix_counts.get(prefix, 0) < 2:
+                prefix = ""
+            descs.append(string_ids.setdefault(desc, len(string_ids)))
+            prefixes.append(string_ids.setdefault(prefix, len(string_ids)))
+            tail = line[len(prefix) :]
+            tails.append(string_ids.setdefault(tail, len(string_ids)))
+            if arg_options:
+                options[i] = arg_options
+        names = list(args)
+        order = array("I", sorted(range(len(names)), key=names.__getitem__))
+        return cls(
+            StringTable.Build(names),
+            order,
+            StringTable.Build(string_ids),
+            descs,
+            prefixes,
+            tails,
+            options,
+        )
+
+    def GetBuffers(self) -> Any:
+        return (
+            self.names.data,
+            self.names.ends,
+            self.order,
+            self.strings.data,
+            self.strings.ends,
+            self.descs,
+            self.prefixes,
+            self.tails,
+        )
+
+    @classmethod
+    def FromBuffers(cls, buffers: Any, options: Any) -> ArgTable:
+        names_data, names_ends, order, strings_data, strings_ends = buffers[:5]
+        descs, prefixes, tails = buffers[5:]
+        return cls(
+            StringTable(names_data, GetUInt32View(names_ends)),
+            GetUInt32View(order),
+            StringTable(strings_data, GetUInt32View(strings_ends)),
+            GetUInt32View(descs),
+            GetUInt32View(prefixes),
+            GetUInt32View(tails),
+            options,
+        )
+
+    def GetState(self) -> Any:
+        # Copies of the buffers, for marshal and pickle.
+        return tuple(bytes(buffer) for buffer in self.GetBuffers()), self.options
+
+    def __reduce__(self) -> Any:
+        return RestoreArgTable, (self.GetState(),)
+
+    def Find(self, arg: str) -> int:
+        # Position of arg, or -1.
+        names = self.names
+        order = self.order
+        low, high = 0, len(order)
+        while low < high:
+            mid = (low + high) // 2
+            name = names[order[mid]]
+            if name < arg:
+                low = mid + 1
+            elif name > arg:
+                high = mid
+            else:
+                return order[mid]
+        return -1
+
+    def GetValue(self, i: int) -> Any:
+        strings = self.strings
+        line = strings[self.prefixes[i]] + strings[self.tails[i]]
+        return strings[self.descs[i]], line, self.options.get(i)
+
+    def __len__(self) -> int:
+        return len(self.descs)
+
+    def __iter__(self) -> Any:
+        return iter(self.names)
+
+    def __contains__(self, arg: Any) -> bool:
+        return isinstance(arg, str) and self.Find(arg) >= 0
+
+    def __getitem__(self, arg: str) -> Any:
+        i = self.Find(arg) if isinstance(arg, str) else -1
+        if i < 0:
+            raise KeyError(arg)
+        return self.GetValue(i)
+
+    def get(self, arg: str, default: Any = None) -> Any:
+        i = self.Find(arg) if isinstance(arg, str) else -1
+        return self.GetValue(i) if i >= 0 else default
+
+    def keys(self) -> StringTable:
+        return self.names
+
+    def values(self) -> Any:
+        return (self.GetValue(i) for i in range(len(self)))
+
+    def items(self) -> Any:
+        return zip(self.names, self.values())
+
+
+ARG_TABLE_BUFFERS = 8
+
+
+def RestoreArgTable(state: Any) -> ArgTable:
+    return ArgTable.FromBuffers(*state)
+
+
+def GetCommandsState(commands: Any) -> Any:
+    # A copy of commands that marshal can write (see RestoreCommands).
+    return {
+        cmd: (desc, line, args.GetState(), cmd_options)
+        for cmd, (desc, line, args, cmd_options) in commands.items()
+    }
+
+
+def RestoreCommands(state: Any) -> Any:
+    return {
+        cmd: (desc, line, RestoreArgTable(args_state), cmd_options)
+        for cmd, (desc, line, args_state, cmd_options) in state.items()
+    }
+
+
+def DumpSectionFile(path: str, header: Any, sections: Any) -> None:
+    refs = []
+    offset = 0
+    with open(f"{path}.tmp", mode="wb") as file:
+        for section in sections:
+            padding = -offset % SECTION_ALIGN
+            file.write(bytes(padding))
+            offset += padding
+            size = memoryview(section).nbytes
+            file.write(section)
+            refs.append((offset, size))
+            offset += size
+        file.write(marshal.dumps((header, refs)))
+        file.write(offset.to_bytes(8, "little"))
+    os.replace(f"{path}.tmp", path)
+
+
+class SectionFile:
+    __slots__ = ("view", "refs")
+
+    def __init__(self, view: Any, refs: Any) -> None:
+        self.view = view
+        self.refs = refs
+
+    def __getitem__(self, i: int) -> Any:
+        offset, size = self.refs[i]
+        return self.view[offset : offset + size]
+
+
+def LoadSectionFile(path: str) -> Any:
+    # Returns (header, sections). Raises OSError, EOFError, ValueError or
+    # TypeError for a missing or broken file.
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(buffer)
+    header_offset = int.from_bytes(view[-8:], "little")
+    header, refs = marshal.loads(view[header_offset:-8])
+    return header, SectionFile(view, refs)
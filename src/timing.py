@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import _thread
+import os
+import sys
+import time
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any
+
+# Phase timing shared by command-zoo.py and commands.py. Nothing is recorded
+# until Start() is called, so an untraced run only pays for entering and
+# leaving a no-op context manager.
+
+_trace = None
+
+
+class Trace:
+    def __init__(self, spec: str) -> None:
+        self.records = []
+        self.depths = {}
+        self.origin = time.perf_counter()
+        self.chrome_file = None
+        self.cprofile_file = None
+        self.profiler = None
+        self.is_finished = False
+        for item in spec.split(","):
+            key, _, value = item.partition("=")
+            if key == "chrome" and value:
+                self.chrome_file = value
+            elif key == "cprofile" and value:
+                self.cprofile_file = value
+
+
+class Phase:
+    __slots__ = ("name", "tid", "wall", "cpu")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> Phase:
+        if _trace is not None:
+            self.tid = _thread.get_ident()
+            _trace.depths[self.tid] = _trace.depths.get(self.tid, 0) + 1
+            self.wall = time.perf_counter()
+            self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if _trace is not None and hasattr(self, "wall"):
+            wall = time.perf_counter() - self.wall
+            cpu = time.thread_time() - self.cpu
+            depth = _trace.depths[self.tid] - 1
+            _trace.depths[self.tid] = depth
+            start = self.wall - _trace.origin
+            _trace.records.append((self.name, self.tid, depth, start, wall, cpu))
+
+
+def Call(name: str, func: Any, *args: Any) -> Any:
+    with Phase(name):
+        return func(*args)
+
+
+def IterItems(name: str, items: Any) -> Any:
+    # Times each step of an iterator separately from the loop body using it.
+    iterator = iter(items)
+    end = object()
+    while True:
+        with Phase(name):
+            item = next(iterator, end)
+        if item is end:
+            return
+        yield item
+
+
+def Start(spec: Any) -> None:
+    global _trace
+    if not spec or spec == "0" or _trace is not None:
+        return
+    _trace = Trace(spec)
+    if _trace.cprofile_file:
+        import cProfile
+
+        _trace.profiler = cProfile.Profile()
+        _trace.profiler.enable()
+    import atexit
+
+    atexit.register(Finish)
+
+
+def Finish() -> None:
+    if _trace is None or _trace.is_finished:
+        return
+    _trace.is_finished = True
+    if _trace.profiler is not None:
+        _trace.profiler.disable()
+        _trace.profiler.dump_stats(_trace.cprofile_file)
+
+    # Phases with the same name at the same depth are summed, so a run over
+    # hundreds of groups still gives a short report.
+    summary = {}
+    for name, tid, depth, start, wall, cpu in sorted(
+        _trace.records, key=lambda record: record[3]
+    ):
+        count, wall_sum, cpu_sum = summary.get((depth, name), (0, 0.0, 0.0))
+        summary[(depth, name)] = count + 1, wall_sum + wall, cpu_sum + cpu
+    total = time.perf_counter() - _trace.origin
+    lines = [f"[TRACE] {'phase':32} {'count':>6} {'wall ms':>10} {'cpu ms':>10}"]
+    for (depth, name), (count, wall, cpu) in summary.items():
+        label = "  " * depth + name
+        lines.append(
+            f"[TRACE] {label:32} {count:6} {wall * 1000:10.2f} {cpu * 1000:10.2f}"
+        )
+    lines.append(f"[TRACE] {'total':32} {'':6} {total * 1000:10.2f}")
+    print("\n".join(lines), file=sys.stderr, flush=True)
+
+    if _trace.chrome_file:
+        import json
+
+        events = []
+        for name, tid, depth, start, wall, cpu in _trace.records:
+            events.append(
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": start * 1e6,
+                    "dur": wall * 1e6,
+                    "pid": os.getpid(),
+                    "tid": tid,
+                    "args": {"cpu_ms": cpu * 1000},
+                }
+            )
+        with open(_trace.chrome_file, mode="wt", encoding="utf-8") as file:
+            json.dump({"traceEvents": events}, file)
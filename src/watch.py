@@ -0,0 +1,156 @@
+import os
+import select
+import struct
+import time
+from typing import Any
+
+# Waits for changes of config files, for `command-zoo.py --watch`. Each path is
+# a file, or a directory in which any *.json counts. inotify (through ctypes,
+# so no extra package) watches the directories, because editors often save by
+# writing a new file and renaming it over the old one. Where inotify is not
+# available the mtime, size and inode of the files are polled.
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    kind = "inotify"
+
+    def __init__(self, paths: Any) -> None:
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # {directory: names of watched files, or None for any *.json}
+        watched_names = {}
+        for path in paths:
+            path = os.path.abspath(path)
+            if os.path.isdir(path):
+                watched_names[path] = None
+            else:
+                dir_path, name = os.path.split(path)
+                names = watched_names.setdefault(dir_path, set())
+                if names is not None:
+                    names.add(os.fsencode(name))
+        self.names = {}
+        for dir_path, names in watched_names.items():
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(dir_path), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(errno, f"inotify_add_watch failed: {dir_path}")
+            self.names[wd] = names
+
+    def IsWatched(self, wd: int, name: bytes) -> bool:
+        names = self.names.get(wd, set())
+        return name.endswith(b".json") if names is None else name in names
+
+    def Read(self, timeout: Any) -> bool:
+        # True when an event for a watched file arrives within timeout seconds
+        # (None waits forever). Events for other files are dropped.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                return False
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                continue
+            offset = 0
+            is_changed = False
+            while offset + EVENT.size <= len(data):
+                wd, mask, _, name_size = EVENT.unpack_from(data, offset)
+                offset += EVENT.size
+                name = data[offset : offset + name_size].rstrip(b"\0")
+                offset += name_size
+                is_changed |= self.IsWatched(wd, name) or bool(mask & IN_Q_OVERFLOW)
+            if is_changed:
+                return True
+
+    def Close(self) -> None:
+        os.close(self.fd)
+
+
+def GetFileSignature(path: str) -> Any:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def GetPathsSignature(paths: Any) -> Any:
+    signatures = []
+    for path in paths:
+        if os.path.isdir(path):
+            try:
+                names = sorted(os.listdir(path))
+            except OSError:
+                names = []
+            for name in names:
+                if name.endswith(".json"):
+                    file_path = os.path.join(path, name)
+                    signatures.append((file_path, GetFileSignature(file_path)))
+        else:
+            signatures.append((path, GetFileSignature(path)))
+    return signatures
+
+
+class PollWatcher:
+    kind = "polling"
+
+    def __init__(self, paths: Any, interval: float) -> None:
+        self.paths = paths
+        self.interval = interval
+        self.signature = GetPathsSignature(paths)
+
+    def Read(self, timeout: Any) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            signature = GetPathsSignature(self.paths)
+            if signature != self.signature:
+                self.signature = signature
+                return True
+            if deadline is None:
+                time.sleep(self.interval)
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.interval, remaining))
+
+    def Close(self) -> None:
+        return
+
+
+def OpenWatcher(paths: Any, poll_interval: float) -> Any:
+    try:
+        return InotifyWatcher(paths)
+    except (OSError, AttributeError):
+        # AttributeError: a libc without inotify (macOS, BSD).
+        return PollWatcher(paths, poll_interval)
+
+
+def WaitChange(watcher: Any, debounce: float) -> None:
+    # Returns once a watched file changed and then stayed quiet for debounce
+    # seconds, so a burst of writes from one save is handled once.
+    watcher.Read(None)
+    while watcher.Read(debounce):
+        pass
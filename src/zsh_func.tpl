@@ -17,11 +17,11 @@ function _{{group}} () {
         (args)
             case $words[2] in
                 help)
-                    _arguments -C '*: :({% for val in commands %}{{val["cmd"]}} {% endfor %})'
-                ;;{% for val in commands %}
-                {{val["cmd"]}})
-                        {% if val["args"]  %}_arguments -C '*: :({% for arg_v in val["args"] %}{{arg_v["arg"]}} {% endfor %})' && {% endif %}\
-                        {% if val["line"]  %}_files -W `pwd`/ && {% endif %}\
+                    _arguments -C '*: :({% for cmd, cmd_v in commands %}{{cmd}} {% endfor %})'
+                ;;{% for cmd, cmd_v in commands %}
+                {{cmd}})
+                        {% if cmd_v[2]  %}_arguments -C '*: :({% for arg in cmd_v[2] %}{{arg}} {% endfor %})' && {% endif %}\
+                        {% if cmd_v[1]  %}_files -W `pwd`/ && {% endif %}\
                         ret=0
                     ;;{% endfor %}
             esac
@@ -37,8 +37,8 @@ function _{{group}} () {
 __{{group}}_commands () {
     local -a _c
     _c=('help:show help'
-        {% for val in commands %}
-        '{{val["cmd"]}}:{% if val["desc"]  %}{{val["desc"]}}{% else %}perform {{val["cmd"]}}{% endif %}'{% endfor %}
+        {% for cmd, cmd_v in commands %}
+        '{{cmd}}:{% if cmd_v[0]  %}{{cmd_v[0]}}{% else %}perform {{cmd}}{% endif %}'{% endfor %}
     )
 
     _describe -t commands Commands _c
@@ -0,0 +1,54 @@
+#compdef {{group}}
+
+# Candidates come from `{{group}} __complete`, asked once per shell session.
+(( ${+_command_zoo_complete_cache} )) || typeset -gA _command_zoo_complete_cache
+
+function _{{group}} () {
+    local context curcontext=$curcontext state line
+    declare -A opt_args
+    local ret=1
+
+    _arguments -C \
+        '(-h --help)'{-h,--help}'[show help]' \
+        '(-s --show)'{-s,--show}'[show only command line]' \
+        '1: :->commands' \
+        '2: :->args' \
+        '*: :->files' \
+        && ret=0
+
+    case $state in
+        (commands)
+            __{{group}}_complete commands '' && ret=0
+            ;;
+        (args)
+            __{{group}}_complete arguments "$line[1]" '' && ret=0
+            ;;
+        (files)
+           here=`pwd`
+           _files -W $here/
+    esac
+
+    return ret
+}
+
+__{{group}}_complete () {
+    local tag=$1
+    shift
+    local key="{{group}} $*"
+    local -a lines _c
+    local ret=1
+
+    if (( ! ${+_command_zoo_complete_cache[$key]} )); then
+        _command_zoo_complete_cache[$key]="$(command {{group}} __complete "$@" 2>/dev/null)"
+    fi
+    lines=("${(@f)_command_zoo_complete_cache[$key]}")
+    _c=("${(@)lines[2,-1]}")
+
+    (( $#_c )) && _describe -t $tag ${(C)tag} _c && ret=0
+    if [[ $lines[1] == *files ]]; then
+        _files -W `pwd`/ && ret=0
+    fi
+    return ret
+}
+
+_{{group}} "$@"
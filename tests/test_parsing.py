@@ -0,0 +1,141 @@
+import importlib.util
+import io
+import json
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, f"{ROOT_DIR}/src")
+
+import commands as group_commands
+import config
+import tables
+
+
+def LoadCommandZoo():
+    spec = importlib.util.spec_from_file_location(
+        "command_zoo", f"{ROOT_DIR}/command-zoo.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+command_zoo = LoadCommandZoo()
+
+
+def BuildCommands(steps):
+    no_args = tables.ArgTable.Build({})
+    return {
+        "help": ("show help", "", no_args, None),
+        "build": ("", "make", no_args, None),
+        "test": ("", "make test", no_args, None),
+        "deploy": ("", "", no_args, {"steps": steps, "keep_going": False}),
+    }
+
+
+def test_find_step_cycle():
+    steps = (("build", ("test",)), ("test", ("deploy x",)), ("deploy x", ("build",)))
+    assert group_commands.FindStepCycle(steps) == [
+        "build",
+        "test",
+        "deploy x",
+        "build",
+    ]
+
+
+def test_find_step_cycle_without_cycle():
+    steps = (("build", ()), ("test", ("build",)), ("test x", ("build", "test")))
+    assert group_commands.FindStepCycle(steps) is None
+
+
+def test_steps_errors_missing_need():
+    commands = BuildCommands((("build", ()), ("test", ("lint",))))
+    assert group_commands.GetStepsErrors(commands, "deploy") == [
+        "'lint' needed by step 'test' of 'deploy' is not a step."
+    ]
+
+
+def test_steps_errors_reports_every_problem():
+    steps = (("build", ("test",)), ("test", ("build", "lint")), ("nope", ()))
+    errors = group_commands.GetStepsErrors(BuildCommands(steps), "deploy")
+    assert errors == [
+        "'lint' needed by step 'test' of 'deploy' is not a step.",
+        "step 'nope' of 'deploy' is not a command of this group.",
+        "steps of 'deploy' form a cycle: build -> test -> build.",
+    ]
+
+
+STREAM_TEXT = '[\n  {"group": "a", "x": "[,]"},\n  {"group": "b\\u00e9"} , []\n]\n'
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64])
+def test_json_stream_reader_split_across_chunks(chunk_size):
+    reader = command_zoo.JsonStreamReader(
+        io.StringIO(STREAM_TEXT), "test.json", chunk_size
+    )
+    assert list(reader.Items()) == json.loads(STREAM_TEXT)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 64])
+def test_json_stream_reader_error_position(chunk_size):
+    text = '[\n  {"group": "a"},\n  {"group" "b"}\n]\n'
+    reader = command_zoo.JsonStreamReader(io.StringIO(text), "test.json", chunk_size)
+    with pytest.raises(SystemExit) as e:
+        list(reader.Items())
+    assert "Expecting ':' delimiter: line 3 column 12" in e.value.code
+
+
+def test_locate_json_path():
+    text = '[\n  {"group": "a", "commands": [\n    {"cmd": 1}\n  ]}\n]'
+    index = config.LocateJsonPath(text, (0, "commands", 0, "cmd"))
+    assert text[index:].startswith("1}")
+    # A missing key points at the deepest container found.
+    index = config.LocateJsonPath(text, (0, "nope"))
+    assert text[index:].startswith('{"group"')
+
+
+def test_config_error_line_and_column():
+    text = '[\n  {"group": 3,\n   "commands": [{"cmd": "a", "line": 5}]}\n]\n'
+    _, _, errors = config.LoadConfigText(text, False)
+    located = [(error.line, error.column, error.message) for error in errors]
+    assert located == [
+        (2, 13, "must be a string."),
+        (3, 38, "must be a string."),
+    ]
+
+
+ARG_NAMES = ["mid", "alpha", "zulu", "kilo"]
+
+
+def BuildArgTable():
+    return tables.ArgTable.Build(
+        {name: (f"{name} desc", f"run {name}", None) for name in ARG_NAMES}
+    )
+
+
+@pytest.mark.parametrize("name", ["alpha", "zulu", "mid"])
+def test_arg_table_find(name):
+    args = BuildArgTable()
+    assert args.Find(name) == ARG_NAMES.index(name)
+    assert args[name] == (f"{name} desc", f"run {name}", None)
+
+
+@pytest.mark.parametrize("name", ["", "aaa", "lima", "zzz"])
+def test_arg_table_find_missing(name):
+    args = BuildArgTable()
+    assert args.Find(name) == -1
+    assert name not in args
+    with pytest.raises(KeyError):
+        args[name]
+
+
+def test_arg_table_from_buffers():
+    args = BuildArgTable()
+    restored = tables.ArgTable.FromBuffers(
+        [bytes(buffer) for buffer in args.GetBuffers()], args.options
+    )
+    assert list(restored.items()) == list(args.items())
+    assert restored.Find("zulu") == ARG_NAMES.index("zulu")